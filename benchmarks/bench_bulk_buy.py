@@ -0,0 +1,96 @@
+"""大批量购买的生成耗时与内存对比：逐张 generate_ticket（旧） vs 分批向量化生成（新）
+
+只在内存中生成并序列化号码（与写入存储前的工作相同），不会写入 data/。
+计时前先校验向量化生成的号码：每注合法、相同种子结果相同、每个号码出现的概率一致（卡方检验）。用法::
+
+    python benchmarks/bench_bulk_buy.py [-n 注数] [--type ssq|dlt]
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.common import lottery  # noqa: E402
+
+CHECK_SAMPLES = 200_000
+CHECK_Z = 3.09  # 单侧 p = 0.001
+
+
+def _chi2_critical(df, z=CHECK_Z):
+    """卡方分布上分位点（Wilson–Hilferty 近似）"""
+    return df * (1 - 2 / (9 * df) + z * math.sqrt(2 / (9 * df))) ** 3
+
+
+def _check_block(l_type):
+    """校验 generate_tickets 的输出，不通过时退出"""
+    block = lottery.generate_tickets(l_type, "2024001", CHECK_SAMPLES, seed=20240101)
+    again = lottery.generate_tickets(l_type, "2024001", CHECK_SAMPLES, seed=20240101)
+    if not (np.array_equal(block.red, again.red) and np.array_equal(block.blue, again.blue)):
+        sys.exit(f"{l_type}：相同种子生成的号码不一致")
+    for (max_number, k), nums in zip(lottery.NUMBER_RULES[l_type], (block.red, block.blue)):
+        if nums.shape != (CHECK_SAMPLES, k) or nums.min() < 1 or nums.max() > max_number:
+            sys.exit(f"{l_type}：号码个数或范围不对")
+        if k > 1 and not (np.diff(nums, axis=1) > 0).all():
+            sys.exit(f"{l_type}：每注号码应不重复且升序")
+        counts = np.bincount(nums.ravel(), minlength=max_number + 1)[1:]
+        expected = CHECK_SAMPLES * k / max_number
+        chi2 = float(((counts - expected) ** 2 / expected).sum())
+        critical = _chi2_critical(max_number - 1)
+        print(f"{l_type} 1..{max_number} 取 {k}：卡方 {chi2:.1f}（临界值 {critical:.1f}）")
+        if chi2 > critical:
+            sys.exit(f"{l_type}：号码分布不均匀")
+
+
+def _old(l_type, n):
+    """旧方式：逐张生成票据字典，全部攒在列表里再一次写入"""
+    tickets = [lottery.generate_ticket(l_type, "2024001") for _ in range(n)]
+    for t in tickets:
+        json.dumps(t["nums"], separators=(",", ":"))
+    return len(tickets)
+
+
+def _new(l_type, n):
+    """新方式：按批生成 TicketBlock，每批序列化后即丢弃"""
+    count = 0
+    for block in lottery.generate_ticket_chunks(l_type, "2024001", n):
+        block.nums_json()
+        count += len(block)
+    return count
+
+
+def _measure(func, l_type, n):
+    """返回 (耗时, 峰值内存)；tracemalloc 本身会拖慢分配，所以计时和测内存分开跑"""
+    start = time.perf_counter()
+    assert func(l_type, n) == n
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func(l_type, n)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=1_000_000, help="生成的注数")
+    parser.add_argument("--type", default="ssq", choices=lottery.LOTTERY_TYPES)
+    args = parser.parse_args()
+
+    for l_type in lottery.LOTTERY_TYPES:
+        _check_block(l_type)
+    print()
+    print(f"{'方式':<10}{'耗时 (s)':>10}{'万注/秒':>10}{'峰值内存 (MB)':>16}")
+    for label, func in (("逐张生成", _old), ("分批生成", _new)):
+        elapsed, peak = _measure(func, args.type, args.n)
+        print(f"{label:<10}{elapsed:>10.2f}{args.n / elapsed / 1e4:>10.1f}{peak / 2**20:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""开奖历史页面解析耗时对比：BeautifulSoup(html.parser) vs lxml
+
+默认用生成的 30/200/1000 行页面（结构与 500.com 历史页一致）测试；
+也可以传入保存下来的真实页面，先校验两种解析结果一致再计时。用法::
+
+    python benchmarks/bench_history_parser.py [-n 次数] [ssq:页面.html dlt:页面.html ...]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.common import fetcher  # noqa: E402
+
+
+def make_page(l_type, rows, latest=24150):
+    """生成与 500.com 历史页结构相同的页面"""
+    rnd = random.Random(f"{l_type}-{rows}")
+    trs = []
+    for i in range(rows):
+        if l_type == "ssq":
+            reds, blues = sorted(rnd.sample(range(1, 34), 6)), [rnd.randint(1, 16)]
+        else:
+            reds, blues = sorted(rnd.sample(range(1, 36), 5)), sorted(rnd.sample(range(1, 13), 2))
+        cells = "".join(f'<td class="t_cfont2">{n:02d}</td>' for n in reds)
+        cells += "".join(f'<td class="t_cfont4">{n:02d}</td>' for n in blues)
+        trs.append(
+            f'<tr class="t_tr1">\n<!--<td>2</td>-->\n<td>{latest - i}</td>{cells}'
+            '<td class="t_cfont8">&nbsp;</td><td>1,234,567</td><td>5</td><td>8,000,000</td>'
+            "<td>120</td><td>200,000</td><td>345,678,901</td><td>2024-01-01</td></tr>"
+        )
+    return (
+        '<html><head><meta charset="utf-8"><title>历史开奖</title></head><body>'
+        '<table id="tablelist"><thead><tr class="th"><th>期号</th></tr></thead>'
+        '<tbody id="tdata">' + "\n".join(trs) + "</tbody></table></body></html>"
+    )
+
+
+def _best_ms(func, html, l_type, n):
+    best = float("inf")
+    for _ in range(n):
+        start = time.perf_counter()
+        func(html, l_type)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=10, help="每个页面重复次数（取最快一次）")
+    parser.add_argument("pages", nargs="*", help="保存的页面，格式为 彩种:路径")
+    args = parser.parse_args()
+
+    cases = []
+    for item in args.pages:
+        l_type, _, path = item.partition(":")
+        with open(path, "r", encoding="utf-8") as f:
+            cases.append((f"{l_type} {os.path.basename(path)}", l_type, f.read()))
+    if not cases:
+        for rows in (30, 200, 1000):
+            for l_type in ("ssq", "dlt"):
+                cases.append((f"{l_type} {rows} 行", l_type, make_page(l_type, rows)))
+
+    print(f"{'页面':<20}{'行数':>6}{'bs4 (ms)':>12}{'lxml (ms)':>12}{'倍数':>8}")
+    for label, l_type, html in cases:
+        expected = fetcher._parse_history_bs4(html, l_type)
+        if fetcher._parse_history_lxml(html, l_type) != expected:
+            sys.exit(f"{label}：两种解析结果不一致")
+        bs4_ms = _best_ms(fetcher._parse_history_bs4, html, l_type, args.n)
+        lxml_ms = _best_ms(fetcher._parse_history_lxml, html, l_type, args.n)
+        print(f"{label:<20}{len(expected):>6}{bs4_ms:>12.2f}{lxml_ms:>12.2f}{bs4_ms / lxml_ms:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""首页渲染耗时对比：每次请求编译模板（旧） vs 使用缓存的已编译模板（新）
+
+只读取 data/ 下现有的数据，不会写入。用法::
+
+    python benchmarks/bench_index_page.py [-n 次数]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import flask  # noqa: E402
+
+from src.common import data  # noqa: E402
+from src.web import app as web  # noqa: E402
+
+
+def _render_from_source(name, **context):
+    """旧的渲染方式：每次都把模板源码交给 render_template_string 重新解析、编译"""
+    source = web.app.jinja_loader.mapping[name]
+    return flask.render_template_string(source, **context)
+
+
+def _measure(client, n):
+    client.get("/")  # 预热：加载数据缓存，新方式下同时完成首次编译
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        resp = client.get("/")
+        samples.append((time.perf_counter() - start) * 1000)
+        assert resp.status_code == 200
+    return samples
+
+
+def _report(label, samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"{label:<10} 中位数 {statistics.median(samples):8.2f} ms   p95 {p95:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=50, help="每种方式请求的次数")
+    args = parser.parse_args()
+
+    purchased, winnings = data.load_all_data()
+    print(
+        f"数据：正式票据 {len(purchased)} 张，测试票据 {len(data.load_test_data())} 张，"
+        f"开奖 SSQ {len(winnings.get('ssq', []))} 期 / DLT {len(winnings.get('dlt', []))} 期"
+    )
+
+    client = web.app.test_client()
+    cached = web.render_template
+    try:
+        web.render_template = _render_from_source
+        before = _measure(client, args.n)
+    finally:
+        web.render_template = cached
+    after = _measure(client, args.n)
+
+    _report("每次编译", before)
+    _report("缓存模板", after)
+    print(f"提速 {statistics.median(before) / statistics.median(after):.1f} 倍")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,36 @@
 """共享模块"""
-from . import config, data, fetcher, lottery
+from . import (
+    config,
+    cooccurrence,
+    data,
+    db,
+    draw_index,
+    fetcher,
+    filelock,
+    jobs,
+    journal,
+    lottery,
+    number_stats,
+    omission,
+    scheduler,
+    sync,
+    ticket_store,
+)
 
-__all__ = ["config", "data", "fetcher", "lottery"]
+__all__ = [
+    "config",
+    "cooccurrence",
+    "data",
+    "db",
+    "draw_index",
+    "fetcher",
+    "filelock",
+    "jobs",
+    "journal",
+    "lottery",
+    "number_stats",
+    "omission",
+    "scheduler",
+    "sync",
+    "ticket_store",
+]
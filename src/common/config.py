@@ -7,10 +7,41 @@ PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..
 DATA_DIR = os.path.join(PROJECT_ROOT, "data")
 DATA_FILE = os.path.join(DATA_DIR, "lottery_data.json")
 TEST_DATA_FILE = os.path.join(DATA_DIR, "lottery_test_data.json")  # 测试数据单独存储
+DB_FILE = os.path.join(DATA_DIR, "lottery.db")
+JOURNAL_FILE = os.path.join(DATA_DIR, "lottery_journal.jsonl")  # JSON 后端的追加日志
+LOCK_FILE = os.path.join(DATA_DIR, "lottery.lock")  # 多进程共享数据时的写锁
+TEMPLATE_CACHE_DIR = os.path.join(DATA_DIR, "template_cache")  # 网页模板编译后的字节码缓存
+
+# JSON 后端：日志超过该大小（字节）后在后台折叠进快照
+JOURNAL_COMPACT_BYTES = int(os.environ.get("LOTTERY_JOURNAL_COMPACT_BYTES", 4 * 1024 * 1024))
+
+# 开奖数据源地址（可指向本地测试服务器）
+FETCH_BASE_URL = os.environ.get("LOTTERY_FETCH_BASE_URL", "http://datachart.500.com")
+
+# 开奖页面的磁盘缓存：同一查询在 TTL（秒）内直接复用，过期后带 ETag / Last-Modified 条件请求
+FETCH_CACHE_DIR = os.path.join(DATA_DIR, "http_cache")
+FETCH_CACHE_TTL = int(os.environ.get("LOTTERY_FETCH_CACHE_TTL", 300))
+
+# 抓取模式："online"（默认）或 "offline"：离线模式只回放录制的页面，不访问网络
+FETCH_MODE = os.environ.get("LOTTERY_FETCH_MODE", "online").strip().lower()
+# 离线回放的页面目录，默认就是磁盘缓存目录（联网运行过一次即相当于录制）
+FETCH_FIXTURE_DIR = os.environ.get("LOTTERY_FETCH_FIXTURE_DIR") or FETCH_CACHE_DIR
+
+# 网页版按开奖时间表在后台自动预取开奖数据，设为 0 关闭
+PREFETCH_ENABLED = os.environ.get("LOTTERY_PREFETCH", "1").strip().lower() not in {"0", "false", "no", "off"}
+
+# 网页版后台任务（联网更新、兑奖、大批量购买）同时运行的数量上限
+JOB_WORKERS = int(os.environ.get("LOTTERY_JOB_WORKERS", 2))
+# 购买注数超过该值时转为后台任务分批生成
+BUY_INLINE_LIMIT = int(os.environ.get("LOTTERY_BUY_INLINE_LIMIT", 1000))
+
+# 存储后端："sqlite"（默认，首次启动自动迁移旧 JSON 数据）或 "json"
+STORAGE_BACKEND = os.environ.get("LOTTERY_STORAGE_BACKEND", "sqlite").strip().lower()
 
 # 资源路径：统一使用 static/img，Web 与 Desktop 共用同一份图片资源
 ASSETS_DIR = os.path.join(PROJECT_ROOT, "static", "img")
 
 # 确保目录存在
 os.makedirs(DATA_DIR, exist_ok=True)
+os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
 os.makedirs(ASSETS_DIR, exist_ok=True)
@@ -0,0 +1,100 @@
+"""红球同出统计（两两同出矩阵与三码组合计数）
+
+由开奖索引里的红球位掩码展开成“期数 × 号码”的 0/1 矩阵（第 0 行为最新一期），
+最近 w 期的两两同出矩阵即前 w 行的外积之和 bits[:w].T @ bits[:w]（对角线为各号码出现次数）；
+三码组合只记录实际出现过的组合（稀疏计数）。同一个索引对应一个最新期号，
+不同窗口的结果按窗口缓存，开奖数据更新后由 data.load_cooccurrence() 换成新的索引。
+"""
+import threading
+from itertools import combinations
+
+import numpy as np
+
+from .lottery import NUMBER_RULES
+
+MEMO_SIZE = 16  # 每个索引最多缓存多少个窗口的结果
+
+
+class CooccurrenceIndex:
+    """单个彩种红球的同出统计
+
+    :param issues: 升序整数期号（与 DrawIndex.columns() 相同）
+    :param red_masks: 与 issues 对齐的红球位掩码
+    """
+
+    def __init__(self, l_type, issues, red_masks):
+        self.l_type = l_type
+        self.max_number = NUMBER_RULES[l_type][0][0]
+        self.latest = int(issues[-1]) if len(issues) else None
+        shifts = np.arange(self.max_number, dtype=np.uint64)
+        masks = np.asarray(red_masks, dtype=np.uint64)[::-1]
+        self.bits = ((masks[:, None] >> shifts) & np.uint64(1)).astype(np.int32)
+        self._lock = threading.Lock()
+        self._pairs = {}  # 窗口 -> 两两同出矩阵
+        self._triples = {}  # 窗口 -> (组合编码, 次数)
+
+    def __len__(self):
+        return len(self.bits)
+
+    def window(self, window=None):
+        """实际统计的期数：不传或超过已有期数时为全部"""
+        n = len(self.bits)
+        return n if window is None else min(max(int(window), 0), n)
+
+    def pairs(self, window=None):
+        """最近 window 期的两两同出次数矩阵，[i, j] 对应号码 i+1 与 j+1（只读）"""
+        w = self.window(window)
+        return self._memo(self._pairs, w, lambda: self.bits[:w].T @ self.bits[:w])
+
+    def triples(self, window=None):
+        """最近 window 期出现过的三码组合：(编码, 次数) 两个数组，编码见 decode_triple()"""
+        w = self.window(window)
+        return self._memo(self._triples, w, lambda: self._count_triples(self.bits[:w]))
+
+    def top_partners(self, number, window=None, limit=10):
+        """最近 window 期中与 number 同出次数最多的号码 [(号码, 次数)]，次数相同按号码升序"""
+        row = self.pairs(window)[number - 1].copy()
+        row[number - 1] = -1  # 排除自身
+        order = np.argsort(-row, kind="stable")[: max(0, min(limit, self.max_number - 1))]
+        return [(int(i) + 1, int(row[i])) for i in order]
+
+    def top_triples(self, window=None, limit=10, number=None):
+        """最近 window 期出现次数最多的三码组合 [((a, b, c), 次数)]，传 number 时只看包含它的组合"""
+        codes, counts = self.triples(window)
+        if number is not None:
+            m, n = self.max_number, number - 1
+            keep = (codes // (m * m) == n) | (codes // m % m == n) | (codes % m == n)
+            codes, counts = codes[keep], counts[keep]
+        # 编码按号码字典序递增，稳定排序后次数相同的组合按号码升序
+        order = np.argsort(-counts, kind="stable")[: max(0, limit)]
+        return [(self.decode_triple(int(codes[i])), int(counts[i])) for i in order]
+
+    def decode_triple(self, code):
+        """组合编码转回 (a, b, c)，编码为 ((a-1)·M + (b-1))·M + (c-1)，M 为红球个数上限"""
+        m = self.max_number
+        return (code // (m * m) + 1, code // m % m + 1, code % m + 1)
+
+    def _count_triples(self, bits):
+        m = self.max_number
+        codes = []
+        sizes = bits.sum(axis=1)
+        # 每期的红球个数一般相同；个数不同的行分组处理，组内一次取出全部三码组合
+        for size in np.unique(sizes[sizes >= 3]).tolist():
+            nums = np.nonzero(bits[sizes == size])[1].reshape(-1, size)
+            combo = np.array(list(combinations(range(size), 3)))
+            picked = nums[:, combo]
+            codes.append(((picked[..., 0] * m + picked[..., 1]) * m + picked[..., 2]).ravel())
+        if not codes:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(codes), return_counts=True)
+
+    def _memo(self, memo, key, compute):
+        with self._lock:
+            value = memo.get(key)
+            if value is None:
+                if len(memo) >= MEMO_SIZE:
+                    memo.clear()
+                value = memo[key] = compute()
+                for array in value if isinstance(value, tuple) else (value,):
+                    array.flags.writeable = False
+            return value
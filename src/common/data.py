@@ -1,52 +1,414 @@
-"""数据持久化模块"""
-import json
+"""数据持久化模块
+
+默认使用 SQLite 存储（见 db.py）；设置环境变量 LOTTERY_STORAGE_BACKEND=json
+可切回 JSON 快照 + 追加日志存储（见 journal.py）。两种后端对外接口一致。
+
+读取结果按正式票据、测试票据、开奖数据三类分别缓存在进程内：每次读取只 stat 一下存储文件
+（mtime/size）并比对该类数据的内部版本号，未变化就直接返回缓存；经由本模块的写入只让
+被写入的那几类缓存失效，例如购票后只读开奖数据的页面不会重新加载全部票据。
+
+所有写入都持有跨进程数据锁（data/lottery.lock），Web 多 worker 与桌面版可以同时读写；
+需要“读出来改完再写回”时使用 transaction()。
+"""
+import contextlib
+import functools
 import os
-from .config import DATA_FILE, TEST_DATA_FILE
+import threading
+
+from . import db, journal
+from .draw_index import DrawIndex
+from .number_stats import NumberStats
+from .omission import OmissionStats
+from .ticket_store import TicketStore
+from .config import LOCK_FILE, STORAGE_BACKEND
+from .cooccurrence import CooccurrenceIndex
+from .filelock import get_lock
+from .lottery import FrequencyTable
+
+_KINDS = ("purchased", "test", "winnings")
+_TICKETS = ("purchased", "test")
+
+_cache_lock = threading.Lock()
+_cache = {}  # 数据类别 -> (stamp, {"data": 票据列表或开奖字典, 以及由它构建的索引、视图})
+_versions = dict.fromkeys(_KINDS, 0)
+_lock = get_lock(LOCK_FILE)
+_draw_index = DrawIndex()  # 进程内共用，开奖数据变化时增量对齐
+_number_stats = NumberStats()  # 同上：各窗口的号码出现次数
+_omission_stats = OmissionStats()  # 同上：号码遗漏统计
+_cooccurrence = {}  # l_type -> CooccurrenceIndex，最新期号与期数不变时复用
+
+
+def _store():
+    return journal if STORAGE_BACKEND == "json" else db
+
+
+def _file_stamp():
+    """存储文件的 (mtime, size)"""
+    stamp = []
+    for path in _store().STORAGE_FILES:
+        try:
+            st = os.stat(path)
+            stamp.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+def _stamp(kind):
+    """缓存校验戳：该类数据的内部版本号 + 存储文件的 (mtime, size)"""
+    return _versions[kind], _file_stamp()
+
+
+def _read(kind):
+    store = _store()
+    if kind == "winnings":
+        return store.load_winnings()
+    return store.load_tickets(is_test=kind == "test")
+
+
+def _cached(kind):
+    """该类数据仍然有效的缓存条目，没有时返回 None"""
+    stamp = _stamp(kind)
+    with _cache_lock:
+        cached = _cache.get(kind)
+        return cached[1] if cached is not None and cached[0] == stamp else None
+
+
+def _load(kind):
+    """读取一类数据（"purchased" / "test" / "winnings"），返回缓存条目"""
+    # 先取校验戳再读数据：读取期间若有写入，下次校验必然不一致
+    stamps = {k: _stamp(k) for k in _KINDS}
+    with _cache_lock:
+        cached = _cache.get(kind)
+        if cached is not None and cached[0] == stamps[kind]:
+            return cached[1]
+    if STORAGE_BACKEND == "json":
+        # JSON 后端读哪一类都要重放整份日志，顺带把三类一起放进缓存
+        snap = _store().load_snapshot()
+        fresh = {k: {"data": snap[k]} for k in _KINDS}
+    else:
+        fresh = {kind: {"data": _read(kind)}}
+    with _cache_lock:
+        for k, entry in fresh.items():
+            cached = _cache.get(k)
+            if k == kind or cached is None or cached[0] != stamps[k]:
+                _cache[k] = (stamps[k], entry)
+    return fresh[kind]
+
+
+def invalidate_cache(kinds=_KINDS):
+    """丢弃缓存（默认全部类别），下次读取时重新加载"""
+    with _cache_lock:
+        for kind in kinds:
+            _versions[kind] += 1
+            _cache.pop(kind, None)
+
+
+def _write(kinds):
+    """写操作：持有数据锁执行，结束后让 kinds 这几类数据的缓存失效
+
+    其余几类的缓存在写入前有效时换上写入后的文件校验戳继续使用：持锁期间没有其他写入。
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _lock:
+                before = _file_stamp()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    _written(kinds, before)
+
+        return wrapper
+
+    return decorator
+
+
+def _written(kinds, before):
+    after = _file_stamp()
+    with _cache_lock:
+        for kind in _KINDS:
+            cached = _cache.pop(kind, None)
+            if kind in kinds:
+                _versions[kind] += 1
+            elif cached is not None and cached[0] == (_versions[kind], before):
+                _cache[kind] = ((_versions[kind], after), cached[1])
+
+
+def _copy_winnings(winnings):
+    # 外层容器复制一份，调用方替换某个彩种的列表不会污染缓存
+    return {l_type: list(items) for l_type, items in winnings.items()}
+
+
+# 注意：返回的票据 / 开奖字典与缓存共享，修改后请通过下面的 save_* 接口写回。
 
 
 def load_all_data():
     """加载所有数据（正式购买）"""
-    if os.path.exists(DATA_FILE):
-        try:
-            with open(DATA_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                purchased = data.get("purchased", [])
-                winnings = data.get("winnings", {"ssq": [], "dlt": []})
-                return purchased, winnings
-        except Exception:
-            pass
-    return [], {"ssq": [], "dlt": []}
+    return list(_load("purchased")["data"]), load_winnings()
 
 
+@_write(_KINDS)
 def save_all_data(purchased, winnings):
     """保存所有数据（正式购买）"""
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(
-            {"purchased": purchased, "winnings": winnings},
-            f,
-            ensure_ascii=False,
-            indent=4,
-        )
+    store = _store()
+    store.replace_tickets(purchased, is_test=False)
+    store.save_winnings(winnings)
+    _draw_index.sync(winnings)
+    _number_stats.sync(winnings)
+    _omission_stats.sync(winnings)
 
 
 def load_test_data():
     """加载测试数据"""
-    if os.path.exists(TEST_DATA_FILE):
-        try:
-            with open(TEST_DATA_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                return data.get("purchased", [])
-        except Exception:
-            pass
-    return []
+    return list(_load("test")["data"])
 
 
+@_write(_TICKETS)
 def save_test_data(purchased):
     """保存测试数据"""
-    with open(TEST_DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(
-            {"purchased": purchased},
-            f,
-            ensure_ascii=False,
-            indent=4,
-        )
+    _store().replace_tickets(purchased, is_test=True)
+
+
+def load_winnings():
+    """只加载开奖数据"""
+    return _copy_winnings(_load("winnings")["data"])
+
+
+def load_ticket_store(is_test: bool = False) -> TicketStore:
+    """返回正式（或测试）票据的列式视图，只用到列式视图（统计、汇总）时使用
+
+    与票据列表共用同一份缓存，数据未变化时不会重复构建。需要按行号取票据时请用 load_tickets_with_store：
+    分别读取的票据列表与列式视图之间可能夹着一次写入，行号不一定对得上。
+    """
+    return _ticket_store(_load("test" if is_test else "purchased"))
+
+
+def load_tickets_with_store(is_test: bool = False):
+    """从同一份缓存取出正式（或测试）票据列表及其列式视图，返回 (tickets, store)，store 第 i 行对应 tickets[i]"""
+    entry = _load("test" if is_test else "purchased")
+    return list(entry["data"]), _ticket_store(entry)
+
+
+def _ticket_store(entry):
+    store = entry.get("store")
+    if store is None:
+        store = entry["store"] = TicketStore.from_dicts(entry["data"])
+    return store
+
+
+def load_draw_index() -> DrawIndex:
+    """返回开奖数据的期号索引（与 load_winnings 的内容一致）
+
+    索引在进程内常驻，开奖数据更新后只合并新增的几期。
+    """
+    entry = _load("winnings")
+    if entry.get("draw_index") is None:
+        _draw_index.sync(entry["data"])
+        entry["draw_index"] = _draw_index
+    return _draw_index
+
+
+def load_number_stats() -> NumberStats:
+    """返回最近 30/100/500 期的号码出现次数统计（与 load_winnings 的内容一致）
+
+    统计在进程内常驻，开奖数据更新后只计入新增的几期、减掉滑出窗口的几期。
+    """
+    entry = _load("winnings")
+    if entry.get("number_stats") is None:
+        _number_stats.sync(entry["data"])
+        entry["number_stats"] = _number_stats
+    return _number_stats
+
+
+def load_omission_stats() -> OmissionStats:
+    """返回号码遗漏统计（与 load_winnings 的内容一致）
+
+    统计在进程内常驻，开奖数据更新后只逐期并入新增的几期。
+    """
+    entry = _load("winnings")
+    if entry.get("omission_stats") is None:
+        _omission_stats.sync(entry["data"])
+        entry["omission_stats"] = _omission_stats
+    return _omission_stats
+
+
+def load_cooccurrence(l_type) -> CooccurrenceIndex:
+    """返回该彩种红球的同出统计（与 load_winnings 的内容一致），按最新期号缓存"""
+    issues, red, _ = load_draw_index().columns(l_type)
+    latest = int(issues[-1]) if len(issues) else None
+    index = _cooccurrence.get(l_type)
+    if index is None or index.latest != latest or len(index) != len(issues):
+        index = _cooccurrence[l_type] = CooccurrenceIndex(l_type, issues, red)
+    return index
+
+
+def load_frequency_table(l_type) -> FrequencyTable:
+    """返回该彩种号码出现次数的前缀和表（与 load_winnings 的内容一致），数据未变化时不会重复构建"""
+    entry = _load("winnings")
+    key = f"frequency_{l_type}"
+    table = entry.get(key)
+    if table is None:
+        table = entry[key] = FrequencyTable(entry["data"].get(l_type) or [], l_type)
+    return table
+
+
+def load_unchecked_tickets(is_test: bool = False):
+    """只加载尚未兑奖的票据：缓存有效时从缓存中筛选，否则只从存储中查出未兑奖的票据"""
+    entry = _cached("test" if is_test else "purchased")
+    if entry is None:
+        return _store().load_tickets(is_test=is_test, unchecked_only=True)
+    return [t for t in entry["data"] if not t.get("checked")]
+
+
+@_write(_TICKETS)
+def add_tickets(tickets, is_test: bool = False):
+    """追加新购买的票据（只写入新增记录）"""
+    _store().add_tickets(tickets, is_test=is_test)
+
+
+@_write(_TICKETS)
+def add_ticket_block(block, is_test: bool = False):
+    """追加一批随机生成的票据（lottery.TicketBlock）；大批量购买时逐批调用，内存只占一批"""
+    _store().add_ticket_block(block, is_test=is_test)
+
+
+def bulk_write():
+    """大批量连续写入（如逐批 add_ticket_block）时使用的上下文，JSON 后端在此期间不折叠日志::
+
+        with data.bulk_write():
+            for block in lottery.generate_ticket_chunks(l_type, issue, n):
+                data.add_ticket_block(block)
+    """
+    return _store().bulk_write()
+
+
+@_write(_TICKETS)
+def save_check_results(tickets, is_test: bool = False):
+    """保存兑奖结果（只更新传入票据的 checked / prize）"""
+    tickets = [t for t in tickets if "id" in t]
+    if tickets:
+        _store().save_check_results(tickets, is_test=is_test)
+
+
+@_write(("winnings",))
+def save_winnings(winnings):
+    """只保存开奖数据"""
+    _store().save_winnings(winnings)
+    _draw_index.sync(winnings)
+    _number_stats.sync(winnings)
+    _omission_stats.sync(winnings)
+
+
+def write_lock():
+    """跨进程数据锁（可重入）；只对开奖数据“读出来改完再写回”时直接持有它即可，不必开事务::
+
+        with data.write_lock():
+            winnings = data.load_winnings()
+            ...
+            data.save_winnings(winnings)
+    """
+    return _lock
+
+
+@_write(_TICKETS)
+def clear_tickets(is_test: bool = False):
+    """清空正式或测试票据"""
+    _store().clear_tickets(is_test=is_test)
+
+
+class Transaction:
+    """transaction() 内看到的数据与改动记录
+
+    purchased / test / winnings 在首次访问时于持锁状态下读取（缓存校验通过时直接用缓存），
+    只用到开奖数据的事务不会加载票据；改动通过下面几个方法记下，
+    提交时只写回这些改动（追加的票据、兑奖结果、开奖数据），不整表重写。
+    """
+
+    def __init__(self):
+        self._data = {}  # 已读取的数据类别 -> 票据列表或开奖字典
+        self._added = []  # [(票据列表, is_test)]
+        self._checked = []  # [(票据列表, is_test)]
+        self._winnings_changed = False
+
+    def _get(self, kind):
+        value = self._data.get(kind)
+        if value is None:
+            if kind == "winnings":
+                value = load_winnings()
+            else:
+                value = list(_load(kind)["data"])
+                for tickets, is_test in self._added:
+                    if is_test == (kind == "test"):
+                        value.extend(tickets)
+            self._data[kind] = value
+        return value
+
+    @property
+    def purchased(self):
+        """正式票据"""
+        return self._get("purchased")
+
+    @property
+    def test(self):
+        """测试票据"""
+        return self._get("test")
+
+    @property
+    def winnings(self):
+        """开奖数据"""
+        return self._get("winnings")
+
+    def unchecked(self, is_test: bool = False):
+        """待兑奖的票据；没有读过该类全部票据时只查出未兑奖的，不加载全部票据"""
+        kind = "test" if is_test else "purchased"
+        if kind in self._data:
+            return [t for t in self._data[kind] if not t.get("checked")]
+        added = [t for tickets, flag in self._added if flag == is_test for t in tickets if not t.get("checked")]
+        return load_unchecked_tickets(is_test) + added
+
+    def add_tickets(self, tickets, is_test: bool = False):
+        """追加新购买的票据"""
+        kind = "test" if is_test else "purchased"
+        if kind in self._data:
+            self._data[kind].extend(tickets)
+        self._added.append((tickets, is_test))
+
+    def save_check_results(self, tickets, is_test: bool = False):
+        """记下兑奖结果（票据的 checked / prize 已在原字典上修改）"""
+        self._checked.append((tickets, is_test))
+
+    def save_winnings(self):
+        """记下 winnings 已被修改（原地修改 self.winnings 后调用）"""
+        self._winnings_changed = True
+
+    def _commit(self):
+        if self._winnings_changed:
+            save_winnings(self.winnings)
+        for tickets, is_test in self._added:
+            add_tickets(tickets, is_test=is_test)
+        for tickets, is_test in self._checked:
+            save_check_results(tickets, is_test=is_test)
+
+
+@contextlib.contextmanager
+def transaction():
+    """跨进程的读-改-写事务
+
+    持有数据锁期间按需读取最新的票据和开奖数据（用缓存校验戳确认缓存仍有效，不整体重新加载），
+    正常退出时只写回记下的改动；事务内抛出异常则不写回。事务期间其他线程、进程的写入会等待::
+
+        with data.transaction() as tx:
+            settled = sync.settle_tickets(tx.unchecked(), draws)
+            tx.save_check_results(settled)
+    """
+    with _lock:
+        tx = Transaction()
+        try:
+            yield tx
+        except BaseException:
+            # 事务内可能已经原地改过与缓存共享的票据字典，丢弃读过的几类缓存
+            invalidate_cache(tuple(tx._data))
+            raise
+        tx._commit()
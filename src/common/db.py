@@ -0,0 +1,261 @@
+"""SQLite 存储后端
+
+票据和开奖号码分别存放在带索引的 tickets / draws 表中：
+购买只插入新增的行，兑奖只更新受影响的行，不再整文件重写 JSON。
+"""
+import contextlib
+import json
+import sqlite3
+import threading
+
+from . import journal
+from .config import DB_FILE
+from .lottery import issue_to_int
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tickets (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    is_test     INTEGER NOT NULL DEFAULT 0,
+    type        TEXT    NOT NULL,
+    issue       TEXT    NOT NULL,
+    nums        TEXT    NOT NULL,
+    checked     INTEGER NOT NULL DEFAULT 0,
+    time        TEXT    NOT NULL DEFAULT '',
+    prize       TEXT    NOT NULL DEFAULT '',
+    recommended INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_tickets_type_issue ON tickets (is_test, type, issue);
+CREATE INDEX IF NOT EXISTS idx_tickets_checked ON tickets (is_test, checked);
+
+CREATE TABLE IF NOT EXISTS draws (
+    type  TEXT    NOT NULL,
+    issue TEXT    NOT NULL,
+    seq   INTEGER NOT NULL,
+    nums  TEXT    NOT NULL,
+    date  TEXT    NOT NULL DEFAULT '',
+    PRIMARY KEY (type, issue)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_draws_seq ON draws (type, seq);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+_TICKET_COLUMNS = "id, type, issue, nums, checked, time, prize, recommended"
+
+# 用于缓存校验的文件（WAL 模式下写入先落到 -wal 文件）
+STORAGE_FILES = (DB_FILE, DB_FILE + "-wal")
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = set()
+
+
+def _dumps(nums):
+    return json.dumps(nums, separators=(",", ":"))
+
+
+def connect(path: str = DB_FILE):
+    """返回当前线程的数据库连接（每个线程一个连接，首次使用时建表并迁移旧 JSON）"""
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with _init_lock:
+                if path not in _initialized:
+                    conn.executescript(SCHEMA)
+                    _upgrade_schema(conn)
+                    migrate_from_json(conn)
+                    _initialized.add(path)
+        except BaseException:
+            # 建表或迁移失败时不缓存连接，下次调用重新尝试
+            conn.close()
+            raise
+        conns[path] = conn
+    return conn
+
+
+def _upgrade_schema(conn):
+    """给旧版数据库补上后来新增的列"""
+    columns = {r[1] for r in conn.execute("PRAGMA table_info(draws)")}
+    if "date" not in columns:
+        with conn:
+            conn.execute("ALTER TABLE draws ADD COLUMN date TEXT NOT NULL DEFAULT ''")
+
+
+def _row_to_ticket(row):
+    tid, l_type, issue, nums, checked, t, prize, recommended = row
+    return {
+        "id": tid,
+        "type": l_type,
+        "issue": issue,
+        "nums": json.loads(nums),
+        "checked": bool(checked),
+        "time": t,
+        "prize": prize,
+        "recommended": bool(recommended),
+    }
+
+
+def _ticket_params(ticket, is_test):
+    return (
+        1 if is_test else 0,
+        ticket["type"],
+        ticket["issue"],
+        _dumps(ticket["nums"]),
+        1 if ticket.get("checked") else 0,
+        ticket.get("time", ""),
+        ticket.get("prize", "") or "",
+        1 if ticket.get("recommended") else 0,
+    )
+
+
+_INSERT_TICKET_SQL = (
+    "INSERT INTO tickets (is_test, type, issue, nums, checked, time, prize, recommended) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def _insert_tickets(conn, tickets, is_test):
+    """逐行插入并把自增 id 回填到票据字典上"""
+    for t in tickets:
+        cur = conn.execute(_INSERT_TICKET_SQL, _ticket_params(t, is_test))
+        t["id"] = cur.lastrowid
+
+
+def load_tickets(is_test: bool = False, unchecked_only: bool = False):
+    """按购买顺序读取票据"""
+    sql = f"SELECT {_TICKET_COLUMNS} FROM tickets WHERE is_test = ?"
+    if unchecked_only:
+        sql += " AND checked = 0"
+    sql += " ORDER BY id"
+    rows = connect().execute(sql, (1 if is_test else 0,)).fetchall()
+    return [_row_to_ticket(r) for r in rows]
+
+
+def load_winnings():
+    """读取开奖数据，每个彩种按期号倒序（最新一期在前）"""
+    winnings = {"ssq": [], "dlt": []}
+    rows = connect().execute(
+        "SELECT type, issue, nums, date FROM draws ORDER BY type, seq DESC"
+    ).fetchall()
+    for l_type, issue, nums, date in rows:
+        item = {"issue": issue, "nums": json.loads(nums)}
+        if date:
+            item["date"] = date
+        winnings.setdefault(l_type, []).append(item)
+    return winnings
+
+
+def load_snapshot():
+    """一次性读取正式票据、测试票据和开奖数据"""
+    return {
+        "purchased": load_tickets(is_test=False),
+        "test": load_tickets(is_test=True),
+        "winnings": load_winnings(),
+    }
+
+
+def add_tickets(tickets, is_test: bool = False):
+    """追加新购买的票据（只插入新增的行）"""
+    conn = connect()
+    with conn:
+        _insert_tickets(conn, tickets, is_test)
+
+
+def add_ticket_block(block, is_test: bool = False):
+    """追加一批随机生成的票据（lottery.TicketBlock），一次 executemany 写入，不构造票据字典"""
+    flag = 1 if is_test else 0
+    recommended = 1 if block.recommended else 0
+    rows = ((flag, block.l_type, block.issue, nums, 0, block.time, "", recommended) for nums in block.nums_json())
+    conn = connect()
+    with conn:
+        conn.executemany(_INSERT_TICKET_SQL, rows)
+
+
+@contextlib.contextmanager
+def bulk_write():
+    """大批量写入（与 JSON 后端接口一致；SQLite 逐批提交即可，无需额外处理）"""
+    yield
+
+
+def save_check_results(tickets, is_test: bool = False):
+    """只更新已兑奖票据的 checked / prize 字段"""
+    conn = connect()
+    with conn:
+        conn.executemany(
+            "UPDATE tickets SET checked = ?, prize = ? WHERE id = ? AND is_test = ?",
+            [
+                (1 if t.get("checked") else 0, t.get("prize", "") or "", t["id"], 1 if is_test else 0)
+                for t in tickets
+            ],
+        )
+
+
+def clear_tickets(is_test: bool = False):
+    """清空正式或测试票据"""
+    conn = connect()
+    with conn:
+        conn.execute("DELETE FROM tickets WHERE is_test = ?", (1 if is_test else 0,))
+
+
+def _save_winnings(conn, winnings):
+    for l_type, items in winnings.items():
+        keep = {item["issue"] for item in items}
+        existing = {
+            r[0] for r in conn.execute("SELECT issue FROM draws WHERE type = ?", (l_type,))
+        }
+        stale = existing - keep
+        if stale:
+            conn.executemany(
+                "DELETE FROM draws WHERE type = ? AND issue = ?",
+                [(l_type, issue) for issue in stale],
+            )
+        # 已有的期次内容变了（更正号码、补上开奖日期）才更新，未变化的行不改写
+        conn.executemany(
+            "INSERT INTO draws (type, issue, seq, nums, date) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (type, issue) DO UPDATE SET nums = excluded.nums, date = excluded.date, seq = excluded.seq "
+            "WHERE nums != excluded.nums OR date != excluded.date OR seq != excluded.seq",
+            [
+                (l_type, item["issue"], issue_to_int(item["issue"]), _dumps(item["nums"]), item.get("date", ""))
+                for item in items
+            ],
+        )
+
+
+def save_winnings(winnings):
+    """保存开奖数据：插入新期次、更新内容有变化的期次、删除被裁掉的旧期次"""
+    conn = connect()
+    with conn:
+        _save_winnings(conn, winnings)
+
+
+def replace_tickets(tickets, is_test: bool = False):
+    """整体替换正式或测试票据（兼容旧的整表保存接口）"""
+    conn = connect()
+    with conn:
+        conn.execute("DELETE FROM tickets WHERE is_test = ?", (1 if is_test else 0,))
+        _insert_tickets(conn, tickets, is_test)
+
+
+def migrate_from_json(conn):
+    """一次性把 JSON 后端的数据（快照 + 追加日志）导入数据库
+
+    迁移完成后在 meta 表中记录标记，之后不再重复导入；原 JSON 文件保留不动。
+    """
+    done = conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+    if done:
+        return False
+    with conn:
+        _insert_tickets(conn, journal.load_tickets(is_test=False), False)
+        _insert_tickets(conn, journal.load_tickets(is_test=True), True)
+        _save_winnings(conn, journal.load_winnings())
+        conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', '1')")
+    return True
@@ -0,0 +1,135 @@
+"""开奖数据索引
+
+按 (彩种, 期号) 建字典，按期号查开奖结果是 O(1)；另外按彩种维护升序的整数期号数组
+以及对齐的红/蓝球位掩码数组，用于区间查询、取最新一期和批量兑奖。
+拉取到新开奖后只需把新增的几期合并进来，不必整体重建。
+"""
+import threading
+
+import numpy as np
+
+from .lottery import LOTTERY_TYPES, issue_to_int, nums_to_mask
+
+_EMPTY_ISSUES = np.zeros(0, dtype=np.int64)
+_EMPTY_MASKS = np.zeros(0, dtype=np.uint64)
+
+
+def draws_head(draws):
+    """记下某彩种开奖列表（新到旧）此刻的状态 (最新期号, 期数, 最旧期号)，供 new_draws() 比对"""
+    return (draws[0]["issue"], len(draws), draws[-1]["issue"]) if draws else None
+
+
+def new_draws(draws, head):
+    """开奖列表比 draws_head() 记下时多出的几期（新到旧），无法增量对齐时返回 None
+
+    开奖列表按期号倒序排列，新拉取的几期都在最前面：当时最新的一期正好在“现有期数 - 当时期数”处、
+    最旧的一期仍在末尾时，前面多出来的就是新增的几期；否则（截断、整表替换等）需要重新统计。
+    各个增量维护的索引、统计（DrawIndex、NumberStats、OmissionStats）都用它与最新开奖对齐。
+    """
+    if head is None:
+        return None
+    latest, count, oldest = head
+    new = len(draws) - count
+    if new < 0 or draws[new]["issue"] != latest or draws[-1]["issue"] != oldest:
+        return None
+    return draws[:new]
+
+
+class DrawIndex:
+    """开奖结果索引，winnings 的格式与 data.load_winnings() 相同"""
+
+    def __init__(self, winnings=None):
+        self._lock = threading.Lock()
+        self._by_key = {}  # (l_type, issue) -> 开奖字典
+        self._heads = {}  # l_type -> 已对齐的开奖列表状态，见 draws_head()
+        # l_type -> (升序整数期号, 红球掩码, 蓝球掩码, 开奖字典列表)，整体替换，读取时无需加锁
+        self._columns = {}
+        if winnings:
+            self.sync(winnings)
+
+    def __len__(self):
+        return len(self._by_key)
+
+    def __contains__(self, key):
+        return key in self._by_key
+
+    def find(self, l_type, issue):
+        """按期号查开奖结果，找不到返回 None"""
+        return self._by_key.get((l_type, issue))
+
+    def latest(self, l_type):
+        """期号最大的一期，没有数据时返回 None"""
+        draws = self._column(l_type)[3]
+        return draws[-1] if draws else None
+
+    def issues(self, l_type):
+        """某彩种全部期号（升序整数数组，只读）"""
+        return self._column(l_type)[0]
+
+    def range(self, l_type, start=None, end=None):
+        """期号在 [start, end] 内的开奖结果（按期号升序），未指定的一端不限"""
+        issues, _, _, draws = self._column(l_type)
+        lo = 0 if start is None else int(np.searchsorted(issues, issue_to_int(start), "left"))
+        hi = len(draws) if end is None else int(np.searchsorted(issues, issue_to_int(end), "right"))
+        return draws[lo:hi]
+
+    def columns(self, l_type):
+        """(升序整数期号, 红球掩码, 蓝球掩码) 三个对齐的数组，供批量兑奖使用"""
+        return self._column(l_type)[:3]
+
+    def _column(self, l_type):
+        return self._columns.get(l_type) or (_EMPTY_ISSUES, _EMPTY_MASKS, _EMPTY_MASKS, [])
+
+    def merge(self, l_type, draws):
+        """合并新开奖（已收录的期号跳过），返回实际新增的开奖结果"""
+        with self._lock:
+            return self._merge(l_type, draws)
+
+    def _merge(self, l_type, draws):
+        added = []
+        for w in draws:
+            key = (l_type, w["issue"])
+            if key not in self._by_key:
+                self._by_key[key] = w
+                added.append(w)
+        numeric = [w for w in added if issue_to_int(w["issue"]) >= 0]
+        if not numeric:
+            return added
+        numeric.sort(key=lambda w: issue_to_int(w["issue"]))
+        new_issues = np.array([issue_to_int(w["issue"]) for w in numeric], dtype=np.int64)
+        new_red = np.array([nums_to_mask(w["nums"][0]) for w in numeric], dtype=np.uint64)
+        new_blue = np.array([nums_to_mask(w["nums"][1]) for w in numeric], dtype=np.uint64)
+
+        issues, red, blue, old_draws = self._column(l_type)
+        pos = np.searchsorted(issues, new_issues, "right")
+        merged_draws = list(old_draws)
+        # 新开奖通常都排在末尾，从后往前插入保证位置不受前面插入的影响
+        for p, w in zip(pos[::-1].tolist(), numeric[::-1]):
+            merged_draws.insert(p, w)
+        columns = (
+            np.insert(issues, pos, new_issues),
+            np.insert(red, pos, new_red),
+            np.insert(blue, pos, new_blue),
+            merged_draws,
+        )
+        for arr in columns[:3]:
+            arr.flags.writeable = False
+        self._columns[l_type] = columns
+        return added
+
+    def _reset(self, l_type):
+        self._by_key = {k: w for k, w in self._by_key.items() if k[0] != l_type}
+        self._columns.pop(l_type, None)
+
+    def sync(self, winnings):
+        """与最新的开奖数据对齐：只合并新增的几期，无法增量对齐时重建该彩种的索引（见 new_draws）"""
+        with self._lock:
+            for l_type in LOTTERY_TYPES:
+                draws = winnings.get(l_type) or []
+                added = new_draws(draws, self._heads.get(l_type))
+                if added is None:
+                    self._reset(l_type)
+                    added = draws
+                if added:
+                    self._merge(l_type, added)
+                self._heads[l_type] = draws_head(draws)
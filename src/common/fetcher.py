@@ -1,42 +1,376 @@
-"""网络数据获取模块"""
+"""网络数据获取模块
+
+所有请求共用一个带连接池的 requests.Session（keep-alive），连接错误和 5xx/429
+按指数退避重试。
+
+抓到的页面按内容哈希存到磁盘缓存（data/http_cache/blobs/），每个 (彩种, 查询) 另存一条
+记录指向页面内容并带上 ETag / Last-Modified：TTL 内的重复查询直接读缓存；过期后带
+If-None-Match / If-Modified-Since 请求，页面未变化时服务器返回 304，复用缓存的页面。
+解析结果按页面内容哈希缓存在内存中，同一页面只解析一次。
+
+离线模式（LOTTERY_FETCH_MODE=offline）只从录制目录回放页面，不访问网络：
+查询完全匹配的录制页面直接使用，否则把该彩种所有录制页面合并后按期数 / 期号区间截取。
+
+fetch_all 并发抓取多个彩种，每个数据源有总耗时上限，个别数据源失败或超时不影响其他彩种。
+
+数据源地址可通过环境变量 LOTTERY_FETCH_BASE_URL 修改（例如指向本地测试服务器）。
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
 import requests
 from bs4 import BeautifulSoup
+from lxml import etree
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import config
+from .filelock import write_bytes_atomic, write_json_atomic
+
+BASE_URL = config.FETCH_BASE_URL
+MODE = config.FETCH_MODE
+CACHE_DIR = config.FETCH_CACHE_DIR
+CACHE_TTL = config.FETCH_CACHE_TTL
+FIXTURE_DIR = config.FETCH_FIXTURE_DIR
+TIMEOUT = 10  # 单次请求超时（秒）
+FETCH_BUDGET = 20  # fetch_all 中每个数据源的总耗时上限（秒，含重试）
+PARSED_CACHE_SIZE = 64
+
+_session = None
+_session_lock = threading.Lock()
+_parsed = OrderedDict()  # (彩种, 页面内容哈希) -> 解析结果
+_parsed_lock = threading.Lock()
+_executor = None
+
+
+def _build_session():
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,  # 0.5s、1s、2s
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET",),
+        raise_on_status=False,  # 重试用尽后照常返回最后一次响应
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """进程内共用的 HTTP 会话"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def clear_cache(disk: bool = False):
+    """清空内存中的解析结果；disk=True 时同时删除磁盘缓存"""
+    with _parsed_lock:
+        _parsed.clear()
+    if disk:
+        for name in os.listdir(CACHE_DIR) if os.path.isdir(CACHE_DIR) else ():
+            sub = os.path.join(CACHE_DIR, name)
+            for fname in os.listdir(sub) if os.path.isdir(sub) else ():
+                os.remove(os.path.join(sub, fname))
+
+
+def _query_string(limit, start, end):
+    if start is not None or end is not None:
+        return "&".join(f"{name}={value}" for name, value in (("start", start), ("end", end)) if value is not None)
+    return f"limit={int(limit)}"
+
+
+def history_url(l_type, limit: int = 30, start=None, end=None) -> str:
+    """历史开奖页面地址；给出 start/end 时按期号区间查询，否则取最近 limit 期"""
+    return f"{BASE_URL.rstrip('/')}/{l_type}/history/newinc/history.php?{_query_string(limit, start, end)}"
+
+
+def _copy_results(results):
+    return [dict(r, nums=[list(r["nums"][0]), list(r["nums"][1])]) for r in results]
+
+
+# ---- 磁盘缓存 ----
+
+
+def _entry_path(directory, l_type, query):
+    key = hashlib.sha256(f"{l_type}?{query}".encode("utf-8")).hexdigest()
+    return os.path.join(directory, l_type, key + ".json")
+
+
+def _blob_path(directory, digest):
+    return os.path.join(directory, "blobs", digest + ".html")
+
+
+def _read_entry(directory, l_type, query):
+    try:
+        with open(_entry_path(directory, l_type, query), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _read_blob(directory, digest):
+    try:
+        with open(_blob_path(directory, digest), "rb") as f:
+            return f.read().decode("utf-8")
+    except OSError:
+        return None
+
+
+def _write_entry(l_type, query, entry):
+    path = _entry_path(CACHE_DIR, l_type, query)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_json_atomic(path, entry, ensure_ascii=False)
+
+
+def _store_page(l_type, query, url, html, etag, last_modified):
+    """页面内容按哈希存一份（相同内容只存一次），并记录该查询指向它"""
+    body = html.encode("utf-8")
+    digest = hashlib.sha256(body).hexdigest()
+    blob = _blob_path(CACHE_DIR, digest)
+    if not os.path.exists(blob):
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        write_bytes_atomic(blob, body)
+    _write_entry(
+        l_type,
+        query,
+        {
+            "url": url,
+            "blob": digest,
+            "fetched_at": time.time(),
+            "etag": etag,
+            "last_modified": last_modified,
+        },
+    )
+    return digest
+
 
+def _parsed_results(l_type, digest, directory=None, html=None):
+    """按页面内容哈希取解析结果（副本），未解析过的从 html 或磁盘读取后解析"""
+    key = (l_type, digest)
+    with _parsed_lock:
+        results = _parsed.get(key)
+        if results is not None:
+            _parsed.move_to_end(key)
+            return _copy_results(results)
+    if html is None:
+        html = _read_blob(directory, digest)
+        if html is None:
+            return None
+    results = _parse_history(html, l_type)
+    with _parsed_lock:
+        _parsed[key] = results
+        while len(_parsed) > PARSED_CACHE_SIZE:
+            _parsed.popitem(last=False)
+    return _copy_results(results)
 
-def fetch_500_data(l_type, limit: int = 30):
+
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def _row_to_record(tds, l_type):
+    """一行单元格文本转开奖记录，格式不对时返回 None
+
+    最后一列是开奖日期（YYYY-MM-DD），有的话记在 "date" 上，供预取调度判断是否已拿到某次开奖。
+    """
+    if len(tds) < 8:
+        return None
+    try:
+        if l_type == "ssq":
+            record = {
+                "issue": tds[0],
+                "nums": [[int(x) for x in tds[1:7]], [int(tds[7])]],
+            }
+        else:
+            record = {
+                "issue": tds[0],
+                "nums": [
+                    [int(x) for x in tds[1:6]],
+                    [int(tds[6]), int(tds[7])],
+                ],
+            }
+    except Exception:
+        return None
+    if len(tds) > 8 and _DATE_RE.fullmatch(tds[-1]):
+        record["date"] = tds[-1]
+    return record
+
+
+def _parse_history_bs4(html, l_type):
+    """解析开奖历史表格（BeautifulSoup + html.parser，纯 Python 实现，保留作对照）"""
+    soup = BeautifulSoup(html, "html.parser")
+    results = []
+    for row in soup.find_all("tr", class_="t_tr1"):
+        record = _row_to_record([td.get_text().strip() for td in row.find_all("td")], l_type)
+        if record is not None:
+            results.append(record)
+    return results
+
+
+_HTML_PARSER = etree.HTMLParser(remove_comments=True)
+_ROWS_XPATH = etree.XPath("//tr[contains(concat(' ', normalize-space(@class), ' '), ' t_tr1 ')]")
+# 每行只需要前 8 个单元格（期号 + 7 个号码）和最后一个单元格（开奖日期）
+_CELLS_XPATH = etree.XPath(".//td[position() <= 8 or position() = last()]")
+
+
+def _parse_history_lxml(html, l_type):
+    """解析开奖历史表格（lxml，C 实现，只取需要的行和单元格）"""
+    if not html or not html.strip():
+        return []
+    try:
+        root = etree.fromstring(html, _HTML_PARSER)
+    except ValueError:
+        # 例如带 encoding 声明的 XML 文本，交给 BeautifulSoup 处理
+        return _parse_history_bs4(html, l_type)
+    if root is None:
+        return []
+    results = []
+    for row in _ROWS_XPATH(root):
+        tds = ["".join(td.itertext()).strip() for td in _CELLS_XPATH(row)]
+        record = _row_to_record(tds, l_type)
+        if record is not None:
+            results.append(record)
+    return results
+
+
+_parse_history = _parse_history_lxml
+
+
+def _recorded_draws(l_type):
+    """离线模式：合并某彩种所有录制页面中的开奖（按期号去重，新到旧）"""
+    directory = os.path.join(FIXTURE_DIR, l_type)
+    merged = {}
+    for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else ():
+        path = os.path.join(directory, name)
+        results = None
+        if name.endswith(".json"):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    digest = json.load(f)["blob"]
+            except (OSError, ValueError, KeyError):
+                continue
+            results = _parsed_results(l_type, digest, FIXTURE_DIR)
+        elif name.endswith(".html"):
+            # 也可以直接放入保存下来的页面
+            with open(path, "r", encoding="utf-8") as f:
+                html = f.read()
+            results = _parsed_results(l_type, hashlib.sha256(html.encode("utf-8")).hexdigest(), html=html)
+        for item in results or ():
+            merged.setdefault(item["issue"], item)
+    return sorted(merged.values(), key=lambda w: int(w["issue"]) if w["issue"].isdigit() else -1, reverse=True)
+
+
+def _replay(l_type, query, limit, start, end):
+    entry = _read_entry(FIXTURE_DIR, l_type, query)
+    if entry:
+        results = _parsed_results(l_type, entry["blob"], FIXTURE_DIR)
+        if results is not None:
+            return results
+    draws = _recorded_draws(l_type)
+    if not draws:
+        raise FileNotFoundError(f"离线模式下没有 {l_type} 的录制页面：{FIXTURE_DIR}")
+    if start is None and end is None:
+        return draws[: int(limit)]
+    lo = int(start) if start is not None else float("-inf")
+    hi = int(end) if end is not None else float("inf")
+    return [w for w in draws if w["issue"].isdigit() and lo <= int(w["issue"]) <= hi]
+
+
+def fetch_500_data(l_type, limit: int = 30, start=None, end=None, max_age=None):
     """从500.com抓取开奖数据
 
     :param l_type: "ssq" 或 "dlt"
     :param limit: 拉取最近多少期，默认 30 期
+    :param start: 起始期号（含），与 end 任给其一时按期号区间查询，忽略 limit
+    :param end: 结束期号（含）
+    :param max_age: 可接受的缓存时长（秒），默认 CACHE_TTL；传 0 表示必须向服务器确认
     """
-    url = f"http://datachart.500.com/{l_type}/history/newinc/history.php?limit={int(limit)}"
-    resp = requests.get(url, timeout=10)
+    query = _query_string(limit, start, end)
+    if MODE == "offline":
+        return _replay(l_type, query, limit, start, end)
+
+    url = history_url(l_type, limit, start, end)
+    max_age = CACHE_TTL if max_age is None else max_age
+    entry = _read_entry(CACHE_DIR, l_type, query)
+    if entry and time.time() - entry.get("fetched_at", 0) < max_age:
+        results = _parsed_results(l_type, entry["blob"], CACHE_DIR)
+        if results is not None:
+            return results
+
+    headers = {}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    resp = get_session().get(url, headers=headers, timeout=TIMEOUT)
+    if resp.status_code == 304 and entry:
+        results = _parsed_results(l_type, entry["blob"], CACHE_DIR)
+        if results is not None:
+            entry["fetched_at"] = time.time()
+            try:
+                _write_entry(l_type, query, entry)
+            except OSError:
+                pass
+            return results
+        # 缓存的页面丢了，重新完整下载
+        resp = get_session().get(url, timeout=TIMEOUT)
+
     resp.encoding = "utf-8"
-    soup = BeautifulSoup(resp.text, "html.parser")
-    rows = soup.find_all("tr", class_="t_tr1")
-    results = []
-    for row in rows:
-        tds = [td.get_text().strip() for td in row.find_all("td")]
-        if len(tds) < 8:
-            continue
+    html = resp.text
+    if resp.status_code != 200:
+        return _parse_history(html, l_type)
+    try:
+        digest = _store_page(
+            l_type, query, url, html, resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+        )
+    except OSError:
+        # 磁盘缓存写不进去不影响本次抓取
+        return _parse_history(html, l_type)
+    return _parsed_results(l_type, digest, html=html)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _session_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="fetcher")
+    return _executor
+
+
+def fetch_all(queries, budget: float = FETCH_BUDGET):
+    """并发抓取多个彩种的开奖数据
+
+    :param queries: {彩种: fetch_500_data 的参数}，如 {"ssq": {"limit": 200}, "dlt": {"start": "24100"}}
+    :param budget: 每个数据源的总耗时上限（秒），所有数据源同时开始计时
+    :return: (results, errors)：成功的 {彩种: 开奖列表}，失败或超时的 {彩种: 异常}
+    """
+    executor = _get_executor()
+    futures = {
+        l_type: executor.submit(fetch_500_data, l_type, **query) for l_type, query in queries.items()
+    }
+    deadline = time.monotonic() + budget
+    results, errors = {}, {}
+    for l_type, future in futures.items():
         try:
-            if l_type == "ssq":
-                results.append(
-                    {
-                        "issue": tds[0],
-                        "nums": [[int(x) for x in tds[1:7]], [int(tds[7])]],
-                    }
-                )
-            else:
-                results.append(
-                    {
-                        "issue": tds[0],
-                        "nums": [
-                            [int(x) for x in tds[1:6]],
-                            [int(tds[6]), int(tds[7])],
-                        ],
-                    }
-                )
-        except Exception:
-            continue
-    return results
+            results[l_type] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            future.cancel()
+            errors[l_type] = TimeoutError(f"{l_type} 数据源超过 {budget} 秒未返回")
+        except Exception as e:
+            errors[l_type] = e
+    return results, errors
+
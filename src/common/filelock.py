@@ -0,0 +1,124 @@
+"""跨进程文件锁与原子写入工具
+
+同一进程内的多个线程由 RLock 串行，进程之间由操作系统的建议锁串行
+（POSIX 使用 fcntl.flock，Windows 使用 msvcrt.locking）。
+"""
+import json
+import os
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _lock_fd(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    # msvcrt 的 LK_LOCK 重试 10 次后会抛 OSError，这里一直等到拿到锁为止
+    while True:
+        try:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+
+def _unlock_fd(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        return
+    os.lseek(fd, 0, os.SEEK_SET)
+    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class FileLock:
+    """可重入的跨进程独占锁，用 with 语句获取与释放"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._rlock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self):
+        self._rlock.acquire()
+        if self._depth == 0:
+            try:
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    _lock_fd(fd)
+                except BaseException:
+                    os.close(fd)
+                    raise
+            except BaseException:
+                self._rlock.release()
+                raise
+            self._fd = fd
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            fd, self._fd = self._fd, None
+            try:
+                _unlock_fd(fd)
+            finally:
+                os.close(fd)
+        self._rlock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def get_lock(path: str) -> FileLock:
+    """同一路径在进程内只对应一把锁，避免同进程内自己和自己抢 OS 锁"""
+    path = os.path.abspath(path)
+    with _locks_guard:
+        lock = _locks.get(path)
+        if lock is None:
+            lock = _locks[path] = FileLock(path)
+        return lock
+
+
+def _write_atomic(path: str, write, mode: str, **open_kwargs):
+    directory = os.path.dirname(path)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, **open_kwargs) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def write_json_atomic(path: str, payload, **dump_kwargs):
+    """写入同目录下的临时文件并 fsync，再原子替换目标文件
+
+    任何时刻崩溃，目标文件要么是旧内容，要么是完整的新内容。
+    """
+    _write_atomic(path, lambda f: json.dump(payload, f, **dump_kwargs), "w", encoding="utf-8")
+
+
+def write_bytes_atomic(path: str, payload: bytes):
+    """同 write_json_atomic，写入原始字节"""
+    _write_atomic(path, lambda f: f.write(payload), "wb")
@@ -0,0 +1,166 @@
+"""进程内后台任务
+
+耗时操作（联网更新、兑奖、大批量购买）提交为后台任务，由固定大小的线程池执行：
+同时运行的任务数不超过 max_workers，多出的排队，页面请求不会被占住。
+任务函数的第一个参数是 Job，通过 job.progress() 汇报进度、job.check_cancelled() 响应取消，
+job.notify() 留下结束时展示给用户的消息。已结束的任务只保留最近 KEEP_FINISHED 个供查询。
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+KEEP_FINISHED = 50
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    """任务已被取消（由 Job.check_cancelled 抛出；带消息时作为展示给用户的说明）"""
+
+
+class Job:
+    """一个后台任务的状态、进度与结果"""
+
+    def __init__(self, name, label):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name  # 任务种类，如 "update"
+        self.label = label  # 展示给用户的描述
+        self.state = QUEUED
+        self.done = 0
+        self.total = None
+        self.message = ""
+        self.level = "info"  # 消息类别，与 flash 的类别一致
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+
+    @property
+    def active(self) -> bool:
+        return self.state in (QUEUED, RUNNING)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def progress(self, done, total=None, message=None):
+        self.done = done
+        if total is not None:
+            self.total = total
+        if message is not None:
+            self.message = message
+
+    def notify(self, message, level="info"):
+        self.message = message
+        self.level = level
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "label": self.label,
+            "state": self.state,
+            "done": self.done,
+            "total": self.total,
+            "message": self.message,
+            "level": self.level,
+            "error": str(self.error) if self.error else None,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class JobRunner:
+    """固定大小线程池上的任务队列"""
+
+    def __init__(self, max_workers=2):
+        self.max_workers = max(1, int(max_workers))
+        self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="job")
+        self._jobs = {}  # id -> Job，按提交顺序
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def submit(self, name, label, func, *args, **kwargs) -> Job:
+        """提交任务，func(job, *args, **kwargs) 的返回值存为 job.result"""
+        with self._lock:
+            job = Job(name, label)
+            self._jobs[job.id] = job
+            self._futures[job.id] = self._pool.submit(self._run, job, func, args, kwargs)
+            self._prune()
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def active(self, name):
+        """同名的还在排队或运行的任务，没有则返回 None"""
+        with self._lock:
+            for job in self._jobs.values():
+                if job.name == name and job.active:
+                    return job
+        return None
+
+    def jobs(self, limit=None):
+        """最近的任务（新到旧）"""
+        with self._lock:
+            items = list(self._jobs.values())
+        items.reverse()
+        return items[:limit] if limit else items
+
+    def cancel(self, job_id) -> bool:
+        """请求取消：排队中的直接取消，运行中的在下一次 check_cancelled 时停止"""
+        job = self._jobs.get(job_id)
+        if job is None or not job.active:
+            return False
+        job._cancel.set()
+        future = self._futures.get(job_id)
+        if future is not None and future.cancel():
+            job.notify(f"{job.label}已取消", "warning")
+            self._finish(job, CANCELLED)
+        return True
+
+    def shutdown(self, wait=True):
+        for job in self.jobs():
+            job._cancel.set()
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, job, func, args, kwargs):
+        if job.cancelled:
+            job.notify(f"{job.label}已取消", "warning")
+            self._finish(job, CANCELLED)
+            return
+        job.state = RUNNING
+        job.started = time.time()
+        try:
+            job.result = func(job, *args, **kwargs)
+        except JobCancelled as e:
+            job.notify(str(e) or f"{job.label}已取消", "warning")
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            job.error = e
+            job.notify(f"{job.label}失败: {e}", "error")
+            self._finish(job, FAILED)
+        else:
+            self._finish(job, DONE)
+
+    def _finish(self, job, state):
+        job.state = state
+        job.finished = time.time()
+        self._futures.pop(job.id, None)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if not job.active]
+        for job_id in finished[: max(0, len(finished) - KEEP_FINISHED)]:
+            del self._jobs[job_id]
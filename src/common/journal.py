@@ -0,0 +1,320 @@
+"""JSON 快照 + 追加日志存储后端
+
+lottery_data.json / lottery_test_data.json 作为快照；购票、兑奖等写操作只往
+lottery_journal.jsonl 追加一行记录，写入成本只与新增记录数有关。
+读取时把日志重放到快照上；日志超过阈值后由后台线程折叠成新快照。
+
+多进程共享同一份数据时，追加与读取都在数据锁（data/lottery.lock）内进行；
+快照通过临时文件 + 原子改名写入，崩溃不会留下半截文件。
+"""
+import contextlib
+import json
+import os
+import threading
+
+from .config import DATA_FILE, JOURNAL_COMPACT_BYTES, JOURNAL_FILE, LOCK_FILE, TEST_DATA_FILE
+from .filelock import get_lock, write_json_atomic
+
+# 折叠时先把当前日志改名，新的写入继续追加到新日志，互不阻塞
+ROTATED_JOURNAL_FILE = JOURNAL_FILE + ".old"
+
+# 用于缓存校验的文件
+STORAGE_FILES = (DATA_FILE, TEST_DATA_FILE, JOURNAL_FILE, ROTATED_JOURNAL_FILE)
+
+_lock = get_lock(LOCK_FILE)  # 追加日志、读取状态、替换快照
+_compact_lock = get_lock(JOURNAL_FILE + ".compact.lock")  # 同一时刻只允许一个折叠任务
+_counters = None  # 见 _refresh_counters
+_compacting = False
+_compacting_guard = threading.Lock()
+_bulk_depth = 0  # 正在进行的 bulk_write() 个数，期间不折叠
+
+
+def _read_snapshot(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            return json.load(f)
+        except ValueError as e:
+            # 不能当成空数据处理，否则下一次写入会把整份数据覆盖掉
+            raise ValueError(f"数据文件已损坏：{path}") from e
+
+
+def _parse_lines(lines):
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            # 崩溃时最后一行可能只写了一半，直接忽略
+            continue
+
+
+def _iter_journal(path):
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        yield from _parse_lines(f)
+
+
+def _ticket_index(state, key):
+    index = state["index"].get(key)
+    if index is None:
+        index = state["index"][key] = {t["id"]: t for t in state[key]}
+    return index
+
+
+def _apply(state, rec):
+    """把一条日志记录应用到内存状态上（已折叠进快照的记录会被跳过）"""
+    key = "test" if rec.get("test") else "purchased"
+    seq = rec.get("seq", 0)
+    if seq <= state["seq"][key]:
+        return
+    state["seq"][key] = seq
+    op = rec.get("op")
+    if op == "add":
+        state[key].extend(rec["tickets"])
+        if state["index"].get(key) is not None:
+            state["index"][key].update((t["id"], t) for t in rec["tickets"])
+    elif op == "check":
+        index = _ticket_index(state, key)
+        for tid, checked, prize in rec["results"]:
+            t = index.get(tid)
+            if t is not None:
+                t["checked"] = checked
+                t["prize"] = prize
+    elif op == "replace":
+        state[key] = rec["tickets"]
+        state["index"][key] = None
+    elif op == "clear":
+        state[key] = []
+        state["index"][key] = None
+    elif op == "winnings":
+        state["winnings"] = rec["winnings"]
+
+
+def _replay(journals):
+    """读取快照并依次重放日志，返回 (状态, 最大日志序号, 最大票据 id)"""
+    formal = _read_snapshot(DATA_FILE)
+    test = _read_snapshot(TEST_DATA_FILE)
+    state = {
+        "purchased": formal.get("purchased", []),
+        "test": test.get("purchased", []),
+        "winnings": formal.get("winnings", {"ssq": [], "dlt": []}),
+        "seq": {
+            "purchased": formal.get("journal_seq", 0),
+            "test": test.get("journal_seq", 0),
+        },
+        "index": {},
+    }
+    # 旧版快照中的票据没有 id，按顺序补上
+    max_id = max((t.get("id", -1) for t in state["purchased"] + state["test"]), default=-1)
+    for t in state["purchased"] + state["test"]:
+        if "id" not in t:
+            max_id += 1
+            t["id"] = max_id
+
+    last_seq = max(state["seq"].values())
+    for path in journals:
+        for rec in _iter_journal(path):
+            last_seq = max(last_seq, rec.get("seq", 0))
+            _apply(state, rec)
+            for t in rec.get("tickets", ()):
+                max_id = max(max_id, t.get("id", -1))
+    return state, last_seq, max_id
+
+
+def _load_state():
+    with _lock:
+        return _replay((ROTATED_JOURNAL_FILE, JOURNAL_FILE))[0]
+
+
+def _mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _journal_identity(st=None):
+    """返回 (日志标识, 日志大小)
+
+    折叠后旧日志被删除，新日志可能复用同一个 inode，因此把快照的修改时间也算进标识。
+    """
+    if st is None:
+        try:
+            st = os.stat(JOURNAL_FILE)
+        except FileNotFoundError:
+            return None, 0
+    return (st.st_dev, st.st_ino, _mtime_ns(DATA_FILE), _mtime_ns(TEST_DATA_FILE)), st.st_size
+
+
+def _refresh_counters():
+    """更新日志序号与票据 id 计数器（需持有数据锁）
+
+    其他进程也可能在追加日志：文件没换过时只解析上次读到位置之后新增的部分；
+    日志被折叠改名或重建过则从快照重新统计一次。
+    """
+    global _counters
+    ident, size = _journal_identity()
+    c = _counters
+    if c is None or c["ident"] != ident or size < c["offset"]:
+        _, last_seq, max_id = _replay((ROTATED_JOURNAL_FILE, JOURNAL_FILE))
+        _counters = {"seq": last_seq, "next_id": max_id + 1, "ident": ident, "offset": size}
+        return
+    if size > c["offset"]:
+        with open(JOURNAL_FILE, "rb") as f:
+            f.seek(c["offset"])
+            chunk = f.read(size - c["offset"])
+        for rec in _parse_lines(chunk.decode("utf-8", errors="replace").splitlines()):
+            c["seq"] = max(c["seq"], rec.get("seq", 0))
+            for t in rec.get("tickets", ()):
+                c["next_id"] = max(c["next_id"], t.get("id", -1) + 1)
+        c["offset"] = size
+
+
+def _append(rec, tickets=None):
+    """追加一条日志；tickets 中的票据会在写入前分配 id"""
+    with _lock:
+        _refresh_counters()
+        c = _counters
+        for t in tickets or ():
+            t["id"] = c["next_id"]
+            c["next_id"] += 1
+        c["seq"] += 1
+        rec["seq"] = c["seq"]
+        line = json.dumps(rec, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+        with open(JOURNAL_FILE, "a+b") as f:
+            end = f.seek(0, os.SEEK_END)
+            if end:
+                # 上次崩溃留下的半行没有换行符，先补一个，免得和本条记录粘在一起
+                f.seek(end - 1)
+                if f.read(1) != b"\n":
+                    line = b"\n" + line
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+            c["ident"], c["offset"] = _journal_identity(os.fstat(f.fileno()))
+    if c["offset"] >= JOURNAL_COMPACT_BYTES and not _bulk_depth:
+        _schedule_compaction()
+
+
+@contextlib.contextmanager
+def bulk_write():
+    """大批量追加期间暂停折叠，结束后日志超过阈值时再折叠一次
+
+    每批几万注的日志行都超过折叠阈值，逐批折叠会让每批都整体重写快照。
+    """
+    global _bulk_depth
+    with _compacting_guard:
+        _bulk_depth += 1
+    try:
+        yield
+    finally:
+        with _compacting_guard:
+            _bulk_depth -= 1
+            done = not _bulk_depth
+        if done and _journal_identity()[1] >= JOURNAL_COMPACT_BYTES:
+            _schedule_compaction()
+
+
+def compact():
+    """把日志折叠进快照，可随时安全调用（多进程下同一时刻只有一个在折叠）"""
+    with _compact_lock:
+        with _lock:
+            if os.path.exists(JOURNAL_FILE) and not os.path.exists(ROTATED_JOURNAL_FILE):
+                os.replace(JOURNAL_FILE, ROTATED_JOURNAL_FILE)
+        if not os.path.exists(ROTATED_JOURNAL_FILE):
+            return
+        # 快照和改名后的日志此时只有折叠任务会修改，解析时无需持有数据锁
+        state, _, _ = _replay((ROTATED_JOURNAL_FILE,))
+        with _lock:
+            write_json_atomic(
+                DATA_FILE,
+                {
+                    "purchased": state["purchased"],
+                    "winnings": state["winnings"],
+                    "journal_seq": state["seq"]["purchased"],
+                },
+                ensure_ascii=False,
+                indent=4,
+            )
+            write_json_atomic(
+                TEST_DATA_FILE,
+                {"purchased": state["test"], "journal_seq": state["seq"]["test"]},
+                ensure_ascii=False,
+                indent=4,
+            )
+            os.remove(ROTATED_JOURNAL_FILE)
+
+
+def _compact_in_background():
+    global _compacting
+    try:
+        compact()
+    finally:
+        _compacting = False
+
+
+def _schedule_compaction():
+    global _compacting
+    with _compacting_guard:
+        if _compacting:
+            return
+        _compacting = True
+    threading.Thread(target=_compact_in_background, name="journal-compaction", daemon=True).start()
+
+
+def load_snapshot():
+    """一次重放同时得到正式票据、测试票据和开奖数据"""
+    state = _load_state()
+    return {"purchased": state["purchased"], "test": state["test"], "winnings": state["winnings"]}
+
+
+def load_tickets(is_test: bool = False, unchecked_only: bool = False):
+    """按购买顺序读取票据"""
+    tickets = _load_state()["test" if is_test else "purchased"]
+    if unchecked_only:
+        return [t for t in tickets if not t.get("checked")]
+    return tickets
+
+
+def load_winnings():
+    """读取开奖数据"""
+    return _load_state()["winnings"]
+
+
+def add_tickets(tickets, is_test: bool = False):
+    """追加新购买的票据"""
+    _append({"op": "add", "test": is_test, "tickets": tickets}, tickets=tickets)
+
+
+def add_ticket_block(block, is_test: bool = False):
+    """追加一批随机生成的票据（lottery.TicketBlock），整批写成一条日志"""
+    add_tickets(block.to_dicts(), is_test=is_test)
+
+
+def save_check_results(tickets, is_test: bool = False):
+    """记录兑奖结果（只写入本次兑奖的票据）"""
+    results = [[t["id"], bool(t.get("checked")), t.get("prize", "") or ""] for t in tickets]
+    _append({"op": "check", "test": is_test, "results": results})
+
+
+def clear_tickets(is_test: bool = False):
+    """清空正式或测试票据"""
+    _append({"op": "clear", "test": is_test})
+
+
+def save_winnings(winnings):
+    """保存开奖数据"""
+    _append({"op": "winnings", "winnings": winnings})
+
+
+def replace_tickets(tickets, is_test: bool = False):
+    """整体替换正式或测试票据（兼容旧的整表保存接口）"""
+    _append(
+        {"op": "replace", "test": is_test, "tickets": tickets},
+        tickets=[t for t in tickets if "id" not in t],
+    )
@@ -1,6 +1,12 @@
 """彩票业务逻辑模块"""
 import random
+import re
 import time
+from enum import IntEnum
+
+import numpy as np
+
+LOTTERY_TYPES = ("ssq", "dlt")
 
 
 # 假设每期奖池为 1 亿，下面的金额只是演示用的固定奖级金额，
@@ -27,47 +33,68 @@ DLT_PRIZE_AMOUNT = {
 }
 
 
-def calculate_prize(l_type, r, b):
-    """计算奖项"""
-    if l_type == "ssq":
-        if r == 6 and b == 1:
-            return "★一等奖(一千万)★"
-        if r == 6:
-            return "二等奖"
-        if r == 5 and b == 1:
-            return "三等奖"
-        if r == 5 or (r == 4 and b == 1):
-            return "四等奖"
-        if r == 4 or (r == 3 and b == 1):
-            return "五等奖"
-        if b == 1:
-            return "六等奖(5元)"
-    else:  # dlt
-        if r == 5 and b == 2:
-            return "★一等奖(一千万)★"
-        if r == 5 and b == 1:
-            return "二等奖"
-        if r == 5:
-            return "三等奖"
-        if r == 4 and b == 2:
-            return "四等奖"
-        if r == 4 and b == 1:
-            return "五等奖"
-        if r == 3 and b == 2:
-            return "六等奖"
-        if r == 4:
-            return "七等奖"
-        if (r == 3 and b == 1) or (r == 2 and b == 2):
-            return "八等奖"
-        if r == 3 or (r == 1 and b == 2) or (r == 2 and b == 1) or b == 2:
-            return "九等奖(5元)"
-    return "未中奖"
-
-
-def get_prize_amount(prize: str) -> int:
-    """根据奖项名称返回假设的奖金金额（单位：元）"""
+class PrizeTier(IntEnum):
+    """奖级编号：0 表示未中奖，1 起依次为一等奖、二等奖……"""
+
+    NONE = 0
+    FIRST = 1
+    SECOND = 2
+    THIRD = 3
+    FOURTH = 4
+    FIFTH = 5
+    SIXTH = 6
+    SEVENTH = 7
+    EIGHTH = 8
+    NINTH = 9
+
+
+# 各彩种奖级编号对应的奖项名称（与上面金额表的顺序一致）
+PRIZE_TIERS = {
+    "ssq": ("未中奖",) + tuple(SSQ_PRIZE_AMOUNT),
+    "dlt": ("未中奖",) + tuple(DLT_PRIZE_AMOUNT),
+}
+
+
+if hasattr(int, "bit_count"):
+    popcount = int.bit_count
+else:  # Python < 3.10
+    def popcount(x: int) -> int:
+        return bin(x).count("1")
+
+
+def nums_to_mask(nums) -> int:
+    """号码列表转位掩码：号码 n 对应第 n-1 位"""
+    mask = 0
+    for n in nums:
+        mask |= 1 << (n - 1)
+    return mask
+
+
+def prize_tier(l_type, prize) -> PrizeTier:
+    """奖项名称转奖级编号，未识别的名称视为未中奖"""
+    try:
+        return PrizeTier(PRIZE_TIERS[l_type].index(prize))
+    except ValueError:
+        return PrizeTier.NONE
+
+
+def prize_name(l_type, tier: int) -> str:
+    """奖级编号转奖项名称"""
+    return PRIZE_TIERS[l_type][tier]
+
+
+_PRIZE_AMOUNTS = {"ssq": SSQ_PRIZE_AMOUNT, "dlt": DLT_PRIZE_AMOUNT}
+
+
+def get_prize_amount(prize: str, l_type=None) -> int:
+    """根据奖项名称返回假设的奖金金额（单位：元）
+
+    两个彩种有同名奖级（如“四等奖”）但金额不同，知道彩种时请传入 l_type。
+    """
     if not prize or prize == "未中奖":
         return 0
+    if l_type is not None:
+        return _PRIZE_AMOUNTS[l_type].get(prize, 0)
     if prize in SSQ_PRIZE_AMOUNT:
         return SSQ_PRIZE_AMOUNT[prize]
     if prize in DLT_PRIZE_AMOUNT:
@@ -76,6 +103,74 @@ def get_prize_amount(prize: str) -> int:
     return 0
 
 
+# 中奖规则：奖级 -> 满足该奖级的 (红球命中数, 蓝球命中数) 组合
+PRIZE_RULES = {
+    "ssq": {
+        PrizeTier.FIRST: [(6, 1)],
+        PrizeTier.SECOND: [(6, 0)],
+        PrizeTier.THIRD: [(5, 1)],
+        PrizeTier.FOURTH: [(5, 0), (4, 1)],
+        PrizeTier.FIFTH: [(4, 0), (3, 1)],
+        PrizeTier.SIXTH: [(2, 1), (1, 1), (0, 1)],
+    },
+    "dlt": {
+        PrizeTier.FIRST: [(5, 2)],
+        PrizeTier.SECOND: [(5, 1)],
+        PrizeTier.THIRD: [(5, 0)],
+        PrizeTier.FOURTH: [(4, 2)],
+        PrizeTier.FIFTH: [(4, 1)],
+        PrizeTier.SIXTH: [(3, 2)],
+        PrizeTier.SEVENTH: [(4, 0)],
+        PrizeTier.EIGHTH: [(3, 1), (2, 2)],
+        PrizeTier.NINTH: [(3, 0), (2, 1), (1, 2), (0, 2)],
+    },
+}
+
+# 查表的行数 / 列数：红球命中 0..6，蓝球命中 0..2（两个彩种共用同一形状）
+MAX_RED_HITS = 6
+MAX_BLUE_HITS = 2
+
+
+def _build_prize_tables():
+    """把 PRIZE_RULES 编译成查表"""
+    tier_tables = {}
+    amount_tables = {}
+    tier_amounts = {}
+    for l_type, rules in PRIZE_RULES.items():
+        names = PRIZE_TIERS[l_type]
+        amounts = np.array([get_prize_amount(name, l_type) for name in names], dtype=np.int64)
+        tiers = np.zeros((MAX_RED_HITS + 1, MAX_BLUE_HITS + 1), dtype=np.int8)
+        for tier, hits in rules.items():
+            for r, b in hits:
+                tiers[r, b] = tier
+        tier_tables[l_type] = tiers
+        tier_amounts[l_type] = amounts
+        amount_tables[l_type] = amounts[tiers]
+    for tables in (tier_tables, amount_tables, tier_amounts):
+        for table in tables.values():
+            table.flags.writeable = False
+    return tier_tables, amount_tables, tier_amounts
+
+
+# 由 PRIZE_RULES 预先编译出的只读查表（NumPy 数组，可直接做花式索引）：
+#   PRIZE_TIER_TABLES[l_type][红球命中数, 蓝球命中数] -> 奖级编号
+#   PRIZE_AMOUNT_TABLES[l_type][红球命中数, 蓝球命中数] -> 奖金
+#   TIER_AMOUNTS[l_type][奖级编号] -> 奖金
+PRIZE_TIER_TABLES, PRIZE_AMOUNT_TABLES, TIER_AMOUNTS = _build_prize_tables()
+
+
+def lookup_tier(l_type, r, b) -> PrizeTier:
+    """按命中数查奖级编号，超出表范围的组合视为未中奖"""
+    if 0 <= r <= MAX_RED_HITS and 0 <= b <= MAX_BLUE_HITS:
+        return PrizeTier(int(PRIZE_TIER_TABLES[l_type][r, b]))
+    return PrizeTier.NONE
+
+
+def calculate_prize(l_type, r, b):
+    """计算奖项"""
+    return PRIZE_TIERS[l_type][lookup_tier(l_type, r, b)]
+
+
 def get_next_issue(winnings, l_type):
     """计算下一期期号"""
     if not winnings[l_type]:
@@ -84,61 +179,84 @@ def get_next_issue(winnings, l_type):
     return str(latest + 1)
 
 
-def _init_weight_dict(max_number: int):
-    """初始化 1..max_number 的权重字典"""
-    return {i: 1 for i in range(1, max_number + 1)}
+def count_numbers(draws, l_type):
+    """统计一组开奖中每个号码的出现次数，越界号码忽略
 
+    :return: (红球计数, 蓝球计数)，第 i 项对应号码 i+1
+    """
+    counts = []
+    for part, (max_number, _) in enumerate(NUMBER_RULES[l_type]):
+        nums = np.array([n for item in draws for n in item["nums"][part]], dtype=np.int64)
+        counts.append(np.bincount(nums[(nums >= 1) & (nums <= max_number)], minlength=max_number + 1)[1:])
+    return tuple(counts)
 
-def _count_history_nums(winnings, l_type, history_count: int = 100):
-    """统计最近 N 期开奖中每个号码出现次数"""
-    history = winnings.get(l_type, [])[:history_count]
-    if l_type == "ssq":
-        red_weights = _init_weight_dict(33)
-        blue_weights = _init_weight_dict(16)
-    else:
-        red_weights = _init_weight_dict(35)
-        blue_weights = _init_weight_dict(12)
-
-    for item in history:
-        reds, blues = item["nums"]
-        for n in reds:
-            if n in red_weights:
-                red_weights[n] += 1
-        for n in blues:
-            if n in blue_weights:
-                blue_weights[n] += 1
-    return red_weights, blue_weights
-
-
-def _pick_by_weight(candidates, weights, count):
-    """根据权重不放回抽取 count 个不同的号码"""
-    pool = list(candidates)
-    result = []
-    for _ in range(count):
-        total = sum(weights[n] for n in pool)
-        r = random.uniform(0, total)
-        acc = 0.0
-        chosen = pool[0]
-        for n in pool:
-            acc += weights[n]
-            if r <= acc:
-                chosen = n
-                break
-        result.append(chosen)
-        pool.remove(chosen)
-    return sorted(result)
+
+def hit_matrix(draws, part, max_number):
+    """一组开奖中每期是否开出每个号码，形状 (期数, 号码个数)，行顺序与 draws 相同；越界号码忽略
+
+    :param part: 0 为红球 / 前区，1 为蓝球 / 后区
+    """
+    hits = np.zeros((len(draws), max_number), dtype=bool)
+    pairs = np.array(
+        [(row, n) for row, item in enumerate(draws) for n in item["nums"][part]], dtype=np.int64
+    ).reshape(-1, 2)
+    pairs = pairs[(pairs[:, 1] >= 1) & (pairs[:, 1] <= max_number)]
+    hits[pairs[:, 0], pairs[:, 1] - 1] = True
+    return hits
+
+
+def recommend_weights(winnings, l_type, history_count: int = 100):
+    """推荐权重：号码 n 的权重为 1 + 最近 N 期开奖中出现的次数
+
+    常驻进程里请用 data.load_number_stats().weights()，它增量维护，不必每次重新统计。
+    :return: (红球权重, 蓝球权重)，第 i 项对应号码 i+1
+    """
+    return tuple(1.0 + c for c in count_numbers(winnings.get(l_type, [])[:history_count], l_type))
+
+
+class FrequencyTable:
+    """单个彩种的号码出现次数前缀和：任意一段开奖的计数只需一次相减
+
+    draws 与 winnings[l_type] 相同，按期号倒序，第 0 行为最新一期。
+    red[k] / blue[k] 为前 k 期（最新的 k 期）中每个号码的出现次数，形状 (len(draws) + 1, 号码个数)。
+    """
+
+    def __init__(self, draws, l_type):
+        self.l_type = l_type
+        self.issues = [item["issue"] for item in draws]
+        # 取负后升序，方便按期号二分查找
+        self._neg_issues = -np.array([issue_to_int(i) for i in self.issues], dtype=np.int64)
+        cums = []
+        for part, (max_number, _) in enumerate(NUMBER_RULES[l_type]):
+            cum = np.zeros((len(draws) + 1, max_number), dtype=np.int32)
+            cum[1:] = hit_matrix(draws, part, max_number)
+            cums.append(np.cumsum(cum, axis=0, out=cum))
+        self.red, self.blue = cums
+
+    def __len__(self):
+        return len(self.issues)
+
+    def counts(self, start=0, stop=None):
+        """第 [start, stop) 行（从最新一期往前数）的号码出现次数 (红球, 蓝球)，越界时截到已有范围"""
+        n = len(self.issues)
+        stop = n if stop is None else min(max(stop, 0), n)
+        start = min(max(start, 0), stop)
+        return self.red[stop] - self.red[start], self.blue[stop] - self.blue[start]
+
+    def issue_window(self, first=None, last=None):
+        """期号在 [first, last]（含两端）内的开奖所在的行区间 (start, stop)，不传表示不限"""
+        start = 0 if last is None else int(np.searchsorted(self._neg_issues, -issue_to_int(last), "left"))
+        stop = len(self.issues) if first is None else int(
+            np.searchsorted(self._neg_issues, -issue_to_int(first), "right")
+        )
+        return start, max(start, stop)
 
 
 def generate_recommended_nums(winnings, l_type, history_count: int = 100):
     """基于最近 N 期历史的简单“热号/冷号”权重生成一注推荐号码"""
-    red_w, blue_w = _count_history_nums(winnings, l_type, history_count=history_count)
-    if l_type == "ssq":
-        reds = _pick_by_weight(range(1, 34), red_w, 6)
-        blues = _pick_by_weight(range(1, 17), blue_w, 1)
-    else:
-        reds = _pick_by_weight(range(1, 36), red_w, 5)
-        blues = _pick_by_weight(range(1, 13), blue_w, 2)
-    return [reds, blues]
+    weights = recommend_weights(winnings, l_type, history_count=history_count)
+    block = generate_tickets(l_type, "", 1, weights=weights)
+    return [block.red[0].tolist(), block.blue[0].tolist()]
 
 
 def _build_ticket(l_type, issue, nums, recommended: bool = False):
@@ -170,6 +288,101 @@ def generate_ticket(l_type, issue, is_test=False):
     return _build_ticket(l_type, issue, nums, recommended=False)
 
 
+# 各彩种号码规则：((红球/前区最大号码, 每注个数), (蓝球/后区最大号码, 每注个数))
+NUMBER_RULES = {
+    "ssq": ((33, 6), (16, 1)),
+    "dlt": ((35, 5), (12, 2)),
+}
+
+BULK_CHUNK = 50_000  # 批量生成时每批的注数
+
+
+def _sample_sorted(rng, n, max_number, k, weights=None):
+    """n 行，每行从 1..max_number 中不重复地取 k 个号码并升序排列
+
+    weights 为 None 时均匀抽取；否则按权重不放回抽取（Efraimidis–Spirakis：
+    每个号码的分数取 Exp(1) / 权重，分数最小的 k 个即为一次按权重逐个不放回抽取的结果）。
+    """
+    if weights is None:
+        if k == 1:
+            return rng.integers(1, max_number + 1, size=(n, 1), dtype=np.int8)
+        # 均匀权重时分数只需可比较，直接用 [0, 1) 均匀分布
+        keys = rng.random((n, max_number), dtype=np.float32)
+    else:
+        keys = rng.standard_exponential((n, max_number), dtype=np.float32) / np.asarray(weights, dtype=np.float32)
+    picks = np.argpartition(keys, k - 1, axis=1)[:, :k].astype(np.int8) + 1
+    picks.sort(axis=1)
+    return picks
+
+
+class TicketBlock:
+    """一批同彩种、同期号的随机票据，号码按列存放：red / blue 每行一注，行内升序"""
+
+    __slots__ = ("l_type", "issue", "red", "blue", "time", "recommended")
+
+    def __init__(self, l_type, issue, red, blue, time_str=None, recommended=False):
+        self.l_type = l_type
+        self.issue = issue
+        self.red = red
+        self.blue = blue
+        self.time = time_str or time.strftime("%Y-%m-%d %H:%M")
+        self.recommended = recommended
+
+    def __len__(self):
+        return len(self.red)
+
+    def nums_json(self):
+        """每注号码的 JSON 文本，如 "[[ 3,11,17,18,20,23],[ 7]]"
+
+        号码按两位定宽（个位数前补空格，仍是合法 JSON），整批在数组上一次拼好，不逐注格式化。
+        """
+        template = "[[" + ",".join(["##"] * self.red.shape[1]) + "],[" + ",".join(["##"] * self.blue.shape[1]) + "]]"
+        pos = np.array([m.start() for m in re.finditer("##", template)])
+        nums = np.hstack([self.red, self.blue]).astype(np.uint32)
+        buf = np.tile(np.frombuffer(template.encode("utf-32-le"), dtype=np.uint32), (len(nums), 1))
+        tens = nums // 10
+        buf[:, pos] = np.where(tens > 0, ord("0") + tens, ord(" "))
+        buf[:, pos + 1] = ord("0") + nums % 10
+        return buf.view(f"<U{len(template)}").ravel().tolist()
+
+    def to_dicts(self):
+        tickets = []
+        for r, b in zip(self.red.tolist(), self.blue.tolist()):
+            ticket = _build_ticket(self.l_type, self.issue, [r, b], recommended=self.recommended)
+            ticket["time"] = self.time
+            tickets.append(ticket)
+        return tickets
+
+
+def _random_block(rng, l_type, issue, n, time_str=None, weights=None):
+    (red_max, red_k), (blue_max, blue_k) = NUMBER_RULES[l_type]
+    red_w, blue_w = weights if weights is not None else (None, None)
+    red = _sample_sorted(rng, n, red_max, red_k, red_w)
+    blue = _sample_sorted(rng, n, blue_max, blue_k, blue_w)
+    return TicketBlock(l_type, issue, red, blue, time_str, recommended=weights is not None)
+
+
+def generate_tickets(l_type, issue, n, seed=None, weights=None):
+    """一次生成 n 张随机彩票，返回列式的 TicketBlock（需要票据字典时调用 to_dicts()）
+
+    每行从号码池中不放回抽取后升序排列。
+    :param seed: 随机种子（整数、SeedSequence 或 numpy Generator），相同种子结果相同
+    :param weights: recommend_weights() 的返回值；给出时按权重抽取，票据标记为推荐
+    """
+    return _random_block(np.random.default_rng(seed), l_type, issue, n, weights=weights)
+
+
+def generate_ticket_chunks(l_type, issue, n, chunk_size=BULK_CHUNK, seed=None, weights=None):
+    """分批生成 n 张随机彩票，每次产出一个不超过 chunk_size 注的 TicketBlock
+
+    与 generate_tickets 相同的抽取方式，但内存占用只与 chunk_size 有关，适合大批量购买边生成边写入。
+    """
+    rng = np.random.default_rng(seed)
+    now = time.strftime("%Y-%m-%d %H:%M")
+    for start in range(0, n, chunk_size):
+        yield _random_block(rng, l_type, issue, min(chunk_size, n - start), now, weights)
+
+
 def create_ticket_with_nums(l_type, issue, nums, recommended: bool = False):
     """根据指定号码创建一张彩票（供推荐购买使用）"""
     # 简单校验长度，避免脏数据
@@ -188,23 +401,23 @@ def create_ticket_with_nums(l_type, issue, nums, recommended: bool = False):
     )
 
 
+def _find_draw(winnings, l_type, issue):
+    """按期号查开奖结果；winnings 可以是开奖字典或 DrawIndex（O(1) 查找）"""
+    if hasattr(winnings, "find"):
+        return winnings.find(l_type, issue)
+    return next((w for w in winnings.get(l_type, []) if w["issue"] == issue), None)
+
+
 def check_ticket(ticket, winnings):
-    """检查单张彩票是否中奖"""
-    win = next(
-        (
-            w
-            for w in winnings.get(ticket["type"], [])
-            if w["issue"] == ticket["issue"]
-        ),
-        None,
-    )
+    """检查单张彩票是否中奖（winnings 可以是开奖字典或 DrawIndex）"""
+    win = _find_draw(winnings, ticket["type"], ticket["issue"])
     if not win:
         return None
 
     my_red, my_blue = ticket["nums"]
     win_red, win_blue = win["nums"]
-    hits_r = len(set(my_red) & set(win_red))
-    hits_b = len(set(my_blue) & set(win_blue))
+    hits_r = popcount(nums_to_mask(my_red) & nums_to_mask(win_red))
+    hits_b = popcount(nums_to_mask(my_blue) & nums_to_mask(win_blue))
     prize = calculate_prize(ticket["type"], hits_r, hits_b)
 
     return {
@@ -213,3 +426,87 @@ def check_ticket(ticket, winnings):
         "prize": prize,
         "winning_nums": win["nums"],
     }
+
+
+def _popcount_array(x):
+    """uint64 数组逐元素统计 1 的个数"""
+    if hasattr(np, "bitwise_count"):  # NumPy >= 2.0
+        return np.bitwise_count(x)
+    x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (x * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+def issue_to_int(issue) -> int:
+    """期号转整数，无法转换时返回 -1"""
+    try:
+        return int(issue)
+    except (TypeError, ValueError):
+        return -1
+
+
+def _ticket_columns(tickets):
+    """取出 (彩种编号, 整数期号, 红球掩码, 蓝球掩码) 四列；支持票据字典列表或 TicketStore"""
+    if hasattr(tickets, "type_code"):
+        return (
+            tickets.type_code,
+            tickets.issue,
+            tickets.red.astype(np.uint64),
+            tickets.blue.astype(np.uint64),
+        )
+    n = len(tickets)
+    type_code = np.empty(n, dtype=np.uint8)
+    issue = np.empty(n, dtype=np.int64)
+    red = np.empty(n, dtype=np.uint64)
+    blue = np.empty(n, dtype=np.uint64)
+    for i, t in enumerate(tickets):
+        my_red, my_blue = t["nums"]
+        type_code[i] = LOTTERY_TYPES.index(t["type"])
+        issue[i] = issue_to_int(t["issue"])
+        red[i] = nums_to_mask(my_red)
+        blue[i] = nums_to_mask(my_blue)
+    return type_code, issue, red, blue
+
+
+def check_tickets_batch(tickets, winnings):
+    """批量兑奖
+
+    开奖号码取自 DrawIndex 中已按期号排好序的位掩码数组，按期号把票据对到开奖结果上，
+    命中数为掩码按位与后的向量化 popcount，奖级查表得出。
+
+    :param tickets: 票据字典列表，或 TicketStore
+    :param winnings: DrawIndex，或开奖字典（临时建一个索引）
+    :return: (tiers, hits_red, hits_blue) 三个与 tickets 等长的数组；
+             该期尚无开奖结果的票据 tier 为 -1、命中数为 0
+    """
+    if not hasattr(winnings, "columns"):
+        from .draw_index import DrawIndex
+
+        winnings = DrawIndex(winnings)
+    type_code, issue, red, blue = _ticket_columns(tickets)
+    n = len(issue)
+    tiers = np.full(n, -1, dtype=np.int8)
+    hits_red = np.zeros(n, dtype=np.int8)
+    hits_blue = np.zeros(n, dtype=np.int8)
+
+    for code, l_type in enumerate(LOTTERY_TYPES):
+        draw_issue, draw_red, draw_blue = winnings.columns(l_type)
+        rows = np.flatnonzero(type_code == code)
+        if not len(draw_issue) or not len(rows):
+            continue
+
+        pos = np.searchsorted(draw_issue, issue[rows])
+        pos[pos >= len(draw_issue)] = 0
+        found = (draw_issue[pos] == issue[rows]) & (issue[rows] >= 0)
+        rows, pos = rows[found], pos[found]
+
+        r = _popcount_array(red[rows] & draw_red[pos]).astype(np.int8)
+        b = _popcount_array(blue[rows] & draw_blue[pos]).astype(np.int8)
+        hits_red[rows] = r
+        hits_blue[rows] = b
+        # 与 lookup_tier 一致：号码个数异常导致命中数超出表范围时视为未中奖
+        in_range = (r <= MAX_RED_HITS) & (b <= MAX_BLUE_HITS)
+        table_tiers = PRIZE_TIER_TABLES[l_type][np.minimum(r, MAX_RED_HITS), np.minimum(b, MAX_BLUE_HITS)]
+        tiers[rows] = np.where(in_range, table_tiers, PrizeTier.NONE)
+    return tiers, hits_red, hits_blue
@@ -0,0 +1,80 @@
+"""号码出现次数统计（滑动窗口）
+
+按彩种维护最近 N 期开奖中每个号码的出现次数，可同时维护多个窗口（默认 30/100/500 期）。
+拉取到新开奖后只把新的一期计入、把滑出窗口的那一期减掉，代价只与每期的号码个数有关；
+推荐号码时直接读取计数，耗时与窗口大小无关。
+"""
+import threading
+from collections import deque
+
+import numpy as np
+
+from .draw_index import draws_head, new_draws
+from .lottery import LOTTERY_TYPES, NUMBER_RULES, count_numbers
+
+WINDOWS = (30, 100, 500)
+
+
+class NumberStats:
+    """各彩种、各窗口的号码出现次数，winnings 的格式与 data.load_winnings() 相同"""
+
+    def __init__(self, windows=WINDOWS, winnings=None):
+        self.windows = tuple(sorted(set(windows)))
+        self._lock = threading.Lock()
+        self._recent = {}  # l_type -> 最近 max(windows) 期开奖（新到旧）
+        self._counts = {}  # (l_type, window) -> [红球计数, 蓝球计数]，第 i 项对应号码 i+1
+        self._heads = {}  # l_type -> 已统计的开奖列表状态，见 draw_index.draws_head()
+        if winnings:
+            self.sync(winnings)
+
+    def counts(self, l_type, window):
+        """最近 window 期中每个号码的出现次数 (红球, 蓝球)，第 i 项对应号码 i+1"""
+        if window not in self.windows:
+            raise ValueError(f"未统计的窗口：{window}（可选 {self.windows}）")
+        with self._lock:
+            counts = self._counts.get((l_type, window))
+            if counts is None:
+                return tuple(np.zeros(max_number, dtype=np.int64) for max_number, _ in NUMBER_RULES[l_type])
+            return tuple(c.copy() for c in counts)
+
+    def weights(self, l_type, window):
+        """推荐权重：1 + 最近 window 期的出现次数（与 lottery.recommend_weights 相同）"""
+        return tuple(1.0 + c for c in self.counts(l_type, window))
+
+    def _rebuild(self, l_type, draws):
+        keep = self.windows[-1]
+        self._recent[l_type] = deque(draws[:keep], maxlen=keep)
+        for window in self.windows:
+            self._counts[(l_type, window)] = list(count_numbers(draws[:window], l_type))
+
+    def _push(self, l_type, draw):
+        """把最新的一期计入各窗口，并减掉因此滑出窗口的那一期"""
+        recent = self._recent[l_type]
+        for window in self.windows:
+            counts = self._counts[(l_type, window)]
+            _add(counts, draw, 1)
+            if len(recent) >= window:
+                _add(counts, recent[window - 1], -1)
+        recent.appendleft(draw)
+
+    def sync(self, winnings):
+        """与最新的开奖数据对齐：只逐期计入新增的几期，无法增量对齐（见 draw_index.new_draws）
+        或新增期数超过最大窗口时重新统计该彩种
+        """
+        with self._lock:
+            for l_type in LOTTERY_TYPES:
+                draws = winnings.get(l_type) or []
+                added = new_draws(draws, self._heads.get(l_type))
+                if added is None or len(added) > self.windows[-1]:
+                    self._rebuild(l_type, draws)
+                else:
+                    for draw in reversed(added):
+                        self._push(l_type, draw)
+                self._heads[l_type] = draws_head(draws)
+
+
+def _add(counts, draw, delta):
+    """把一期开奖的号码计入（delta=1）或移出（delta=-1）计数；越界号码与 count_numbers 一样忽略"""
+    for part, nums in enumerate(draw["nums"]):
+        idx = np.asarray(nums, dtype=np.int64) - 1
+        np.add.at(counts[part], idx[(idx >= 0) & (idx < len(counts[part]))], delta)
@@ -0,0 +1,129 @@
+"""号码遗漏与间隔统计
+
+按彩种统计全部开奖历史中每个号码的：
+- 当前遗漏：最近连续多少期没有开出（最新一期开出为 0）
+- 最大遗漏：历史上最长的连续未开出期数（含当前遗漏）
+- 平均遗漏：(总期数 - 出现次数) / (出现次数 + 1)，即被每次开出分隔开的各段未开出期数的平均值
+- 当前连开 / 最大连开：连续开出的期数
+
+首次统计时对整张“期数 × 号码”的命中矩阵做一次向量化计算；之后新开奖按时间顺序逐期并入，
+每期只做几次长度为号码个数的数组运算，与历史期数无关。
+"""
+import threading
+
+import numpy as np
+
+from .draw_index import draws_head, new_draws
+from .lottery import LOTTERY_TYPES, NUMBER_RULES, hit_matrix
+
+PARTS = ("red", "blue")
+
+
+def _run_lengths(mask):
+    """每一行处、每一列截至该行的连续 True 长度"""
+    rows = np.arange(1, len(mask) + 1)[:, None]
+    last_false = np.maximum.accumulate(np.where(mask, 0, rows), axis=0)
+    return rows - last_false
+
+
+class _PartStats:
+    """一个彩种红球或蓝球部分的统计状态，第 i 项对应号码 i+1"""
+
+    def __init__(self, hits):
+        self.draws = len(hits)
+        self.hits = hits.sum(axis=0).astype(np.int64)
+        if self.draws:
+            misses = _run_lengths(~hits)
+            streaks = _run_lengths(hits)
+            self.omission, self.max_omission = misses[-1], misses.max(axis=0)
+            self.streak, self.max_streak = streaks[-1], streaks.max(axis=0)
+        else:
+            zeros = np.zeros(hits.shape[1], dtype=np.int64)
+            self.omission, self.max_omission, self.streak, self.max_streak = (zeros.copy() for _ in range(4))
+
+    def push(self, hit):
+        """并入最新的一期，hit 为该期是否开出每个号码"""
+        self.draws += 1
+        self.hits = self.hits + hit
+        self.omission = np.where(hit, 0, self.omission + 1)
+        self.max_omission = np.maximum(self.max_omission, self.omission)
+        self.streak = np.where(hit, self.streak + 1, 0)
+        self.max_streak = np.maximum(self.max_streak, self.streak)
+
+    def to_list(self):
+        avg_gap = (self.draws - self.hits) / (self.hits + 1)
+        columns = zip(
+            self.hits.tolist(),
+            self.omission.tolist(),
+            self.max_omission.tolist(),
+            avg_gap.round(2).tolist(),
+            self.streak.tolist(),
+            self.max_streak.tolist(),
+        )
+        return [
+            {
+                "number": number,
+                "hits": hits,
+                "omission": omission,
+                "max_omission": max_omission,
+                "avg_gap": gap,
+                "streak": streak,
+                "max_streak": max_streak,
+            }
+            for number, (hits, omission, max_omission, gap, streak, max_streak) in enumerate(columns, 1)
+        ]
+
+
+class OmissionStats:
+    """各彩种的号码遗漏统计，winnings 的格式与 data.load_winnings() 相同"""
+
+    def __init__(self, winnings=None):
+        self._lock = threading.Lock()
+        self._parts = {}  # l_type -> (红球 _PartStats, 蓝球 _PartStats)
+        self._heads = {}  # l_type -> 已统计的开奖列表状态，见 draw_index.draws_head()
+        self._summary = {}  # l_type -> summary() 的结果，统计变化时清除
+        if winnings:
+            self.sync(winnings)
+
+    def summary(self, l_type):
+        """该彩种每个号码的遗漏统计（可直接转成 JSON）；统计未变化时返回同一份缓存结果"""
+        with self._lock:
+            cached = self._summary.get(l_type)
+            if cached is None:
+                parts = self._parts.get(l_type) or self._build(l_type, [])
+                head = self._heads.get(l_type)
+                cached = self._summary[l_type] = {
+                    "type": l_type,
+                    "draws": parts[0].draws,
+                    "latest": head[0] if head else None,
+                    **{name: part.to_list() for name, part in zip(PARTS, parts)},
+                }
+            return cached
+
+    def _build(self, l_type, draws):
+        """draws 为新到旧（与 winnings 相同）"""
+        draws = draws[::-1]
+        return tuple(
+            _PartStats(hit_matrix(draws, part, max_number))
+            for part, (max_number, _) in enumerate(NUMBER_RULES[l_type])
+        )
+
+    def _push(self, l_type, draw):
+        for part, ((max_number, _), stats) in enumerate(zip(NUMBER_RULES[l_type], self._parts[l_type])):
+            stats.push(hit_matrix([draw], part, max_number)[0])
+
+    def sync(self, winnings):
+        """与最新的开奖数据对齐：只逐期并入新增的几期，无法增量对齐时重新统计该彩种（见 draw_index.new_draws）"""
+        with self._lock:
+            for l_type in LOTTERY_TYPES:
+                draws = winnings.get(l_type) or []
+                added = new_draws(draws, self._heads.get(l_type))
+                if added is None:
+                    self._parts[l_type] = self._build(l_type, draws)
+                elif added:
+                    for draw in reversed(added):
+                        self._push(l_type, draw)
+                else:
+                    continue
+                self._heads[l_type] = draws_head(draws)
+                self._summary.pop(l_type, None)
@@ -0,0 +1,191 @@
+"""按开奖时间表自动预取开奖数据
+
+双色球每周二、四、日 21:15 开奖，大乐透每周一、三、六 21:25 开奖（北京时间）。
+后台线程在每次开奖后 PUBLISH_DELAY 开始拉取，数据源还没更新时按 RETRY_BACKOFF 退避重试，
+超过 RETRY_WINDOW 仍没拿到就等下一次开奖。是否已拿到按本地最新一期的开奖日期判断，
+本地已有这次开奖（启动时补齐或手动更新拿到的）就不再请求。拿到新数据后为等待开奖的票据兑奖，
+并顺带预热开奖索引、号码与遗漏统计和票据列式视图，网页请求不必再等网络。
+"""
+import threading
+from datetime import datetime, time, timedelta, timezone
+
+from . import data, sync
+from .lottery import LOTTERY_TYPES
+
+CST = timezone(timedelta(hours=8), "CST")  # 北京时间，无夏令时
+
+# 彩种 -> (开奖星期（周一为 0）, 开奖时间)
+DRAW_SCHEDULE = {
+    "ssq": ((1, 3, 6), time(21, 15)),
+    "dlt": ((0, 2, 5), time(21, 25)),
+}
+
+PUBLISH_DELAY = timedelta(minutes=10)  # 开奖后多久开始拉取
+RETRY_BACKOFF = (60, 120, 300, 600, 1200)  # 数据源尚未更新时的重试间隔（秒），之后按最后一项
+RETRY_WINDOW = timedelta(hours=3)  # 开奖后最多重试多久
+
+
+def _now():
+    return datetime.now(CST)
+
+
+def next_draw_time(l_type, after: datetime) -> datetime:
+    """after 之后（不含）的下一次开奖时间"""
+    weekdays, at = DRAW_SCHEDULE[l_type]
+    after = after.astimezone(CST)
+    for days in range(8):
+        day = after.date() + timedelta(days=days)
+        draw = datetime.combine(day, at, tzinfo=CST)
+        if day.weekday() in weekdays and draw > after:
+            return draw
+    raise ValueError(f"{l_type} 没有开奖日")
+
+
+def last_draw_time(l_type, before: datetime) -> datetime:
+    """before 之前（含）的最近一次开奖时间"""
+    weekdays, at = DRAW_SCHEDULE[l_type]
+    before = before.astimezone(CST)
+    for days in range(8):
+        day = before.date() - timedelta(days=days)
+        draw = datetime.combine(day, at, tzinfo=CST)
+        if day.weekday() in weekdays and draw <= before:
+            return draw
+    raise ValueError(f"{l_type} 没有开奖日")
+
+
+def _warm_caches():
+    """重新加载数据并构建开奖索引、号码统计、遗漏统计、票据列式视图"""
+    data.load_draw_index()
+    data.load_number_stats()
+    data.load_omission_stats()
+    data.load_ticket_store()
+    data.load_ticket_store(is_test=True)
+
+
+class PrefetchScheduler:
+    """开奖后自动拉取的后台调度器，start() 后常驻"""
+
+    def __init__(self, types=LOTTERY_TYPES):
+        self.types = tuple(types)
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._due = {}  # 彩种 -> 下一次拉取时间
+        self._awaiting = {}  # 彩种 -> 正在等待结果的开奖时间
+        self._attempts = {}  # 彩种 -> 本次开奖已重试次数
+        self.last_run = None
+        self.last_added = {}
+        self.last_errors = {}
+        self.last_settled = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="draw-prefetch", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def status(self):
+        """调度状态：各彩种下一次拉取时间、上次运行时间与结果"""
+        return {
+            "running": self.running,
+            "next_fetch": {t: at.isoformat() for t, at in self._due.items()},
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            "last_added": {t: len(issues) for t, issues in self.last_added.items()},
+            "last_errors": {t: str(e) for t, e in self.last_errors.items()},
+            "last_settled": self.last_settled,
+        }
+
+    def _schedule_next_draw(self, l_type, now):
+        draw = next_draw_time(l_type, now - PUBLISH_DELAY)
+        self._awaiting[l_type] = draw
+        self._attempts[l_type] = 0
+        self._due[l_type] = draw + PUBLISH_DELAY
+
+    def _sync(self, types):
+        with self._sync_lock:
+            try:
+                # 刚开奖时缓存里的页面一定是旧的，必须向数据源确认
+                _, added, errors = sync.sync(types=types, max_age=0)
+            except Exception as e:
+                added, errors = {}, {t: e for t in types}
+            settled = 0
+            if any(added.values()):
+                try:
+                    settled = sum(map(len, sync.settle_pending()))
+                    _warm_caches()
+                except Exception:
+                    pass
+            self.last_run = _now()
+            self.last_added = added
+            self.last_errors = errors
+            self.last_settled = settled
+        return added
+
+    def _received(self, l_type, added=None):
+        """本地是否已有正在等待的这次（或更晚的）开奖
+
+        按本地最新一期的开奖日期判断；旧数据没有日期时只能看这次同步是否拿到了新的期号。
+        """
+        latest = data.load_draw_index().latest(l_type)
+        date = (latest or {}).get("date")
+        if date:
+            return date >= self._awaiting[l_type].date().isoformat()
+        return bool(added and added.get(l_type))
+
+    def _run_due(self, types, now):
+        # 本地已有这次开奖的彩种不必再请求
+        waiting = [t for t in types if not self._received(t)]
+        added = self._sync(waiting) if waiting else {}
+        for l_type in types:
+            if self._received(l_type, added):
+                self._schedule_next_draw(l_type, now + PUBLISH_DELAY)
+                continue
+            # 数据源还没更新（或请求失败）：在窗口期内退避重试，否则等下一次开奖
+            attempt = self._attempts.get(l_type, 0)
+            self._attempts[l_type] = attempt + 1
+            if now - self._awaiting[l_type] < RETRY_WINDOW:
+                delay = RETRY_BACKOFF[min(attempt, len(RETRY_BACKOFF) - 1)]
+                self._due[l_type] = now + timedelta(seconds=delay)
+            else:
+                self._schedule_next_draw(l_type, now + PUBLISH_DELAY)
+
+    def _run(self):
+        now = _now()
+        for l_type in self.types:
+            last = last_draw_time(l_type, now)
+            if now - last < RETRY_WINDOW:
+                # 启动时刚开过奖：补齐时拿到的数据不一定包含这一期，之后继续按重试流程确认
+                self._awaiting[l_type] = last
+                self._attempts[l_type] = 0
+                self._due[l_type] = max(last + PUBLISH_DELAY, now + timedelta(seconds=RETRY_BACKOFF[0]))
+            else:
+                self._schedule_next_draw(l_type, now)
+        self._sync(self.types)  # 启动时先补齐一次
+        for l_type in self.types:
+            # 补齐时已拿到刚开的这一期就直接等下一次开奖（这里不看新增期号：首次拉取的历史数据不算）
+            if self._received(l_type):
+                self._schedule_next_draw(l_type, now + PUBLISH_DELAY)
+        while not self._stopping.is_set():
+            wait = min(self._due.values()) - _now()
+            self._wake.wait(max(0.0, wait.total_seconds()))
+            self._wake.clear()
+            if self._stopping.is_set():
+                break
+            now = _now()
+            due = [t for t in self.types if self._due[t] <= now]
+            if due:
+                self._run_due(due, now)
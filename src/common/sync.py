@@ -0,0 +1,129 @@
+"""开奖数据增量同步
+
+根据本地最新期号算出缺失的期号区间，只向数据源请求这一段（start/end 参数）；
+新数据按期号去重后插到开奖列表前面，比对次数只与新增期数有关。
+返回每个彩种新增了哪些期号，下游缓存可以据此精确失效。
+本地还没有数据的彩种一次性拉取最近 INITIAL_LIMIT 期。
+"""
+from . import data, fetcher, lottery
+from .draw_index import DrawIndex
+from .lottery import LOTTERY_TYPES, issue_to_int
+
+INITIAL_LIMIT = 1000
+# 期号为“年份后两位 + 当年序号”，往后 1000 个号足以跨到下一年
+RANGE_SPAN = 1000
+
+
+def missing_range(draws, l_type):
+    """本地缺失的期号区间 (start, end)，本地没有数据时返回 None"""
+    latest = draws.latest(l_type)
+    if latest is None:
+        return None
+    n = issue_to_int(latest["issue"])
+    return str(n + 1), str(n + RANGE_SPAN)
+
+
+def _query(draws, l_type):
+    missing = missing_range(draws, l_type)
+    if missing is None:
+        return {"limit": INITIAL_LIMIT}
+    start, end = missing
+    return {"start": start, "end": end}
+
+
+def merge_new(winnings, draws, l_type, remote):
+    """把 remote 中比本地更新的开奖插到 winnings[l_type] 前面（原地修改）
+
+    :return: 新增的期号列表（新到旧）
+    """
+    latest = draws.latest(l_type)
+    floor = issue_to_int(latest["issue"]) if latest else -1
+    new = {}
+    for item in remote:
+        issue = item["issue"]
+        if issue_to_int(issue) > floor and issue not in new and draws.find(l_type, issue) is None:
+            new[issue] = item
+    if not new:
+        return []
+    items = sorted(new.values(), key=lambda w: issue_to_int(w["issue"]), reverse=True)
+    winnings[l_type] = items + (winnings.get(l_type) or [])
+    return [w["issue"] for w in items]
+
+
+def fetch_missing(draws, types=LOTTERY_TYPES, budget=fetcher.FETCH_BUDGET, max_age=None):
+    """并发抓取 draws 中各彩种缺失的期号（只抓取，不合并）
+
+    :param max_age: 可接受的页面缓存时长（秒），默认见 fetcher.CACHE_TTL
+    :return: (fetched, errors)：{彩种: 抓到的开奖列表}，抓取失败或超时的 {彩种: 异常}
+    """
+    queries = {l_type: _query(draws, l_type) for l_type in types}
+    if max_age is not None:
+        for query in queries.values():
+            query["max_age"] = max_age
+    return fetcher.fetch_all(queries, budget)
+
+
+def sync_winnings(winnings, draws=None, types=LOTTERY_TYPES, budget=fetcher.FETCH_BUDGET, max_age=None):
+    """并发抓取各彩种缺失的开奖并合并进 winnings（原地修改，不保存）
+
+    :param draws: 与 winnings 一致的 DrawIndex，不传则临时构建
+    :return: (added, errors)：{彩种: 新增期号列表}，errors 同 fetch_missing
+    """
+    if draws is None:
+        draws = DrawIndex(winnings)
+    fetched, errors = fetch_missing(draws, types, budget, max_age)
+    added = {l_type: merge_new(winnings, draws, l_type, remote) for l_type, remote in fetched.items()}
+    return added, errors
+
+
+def sync(types=LOTTERY_TYPES, budget=fetcher.FETCH_BUDGET, max_age=None):
+    """补齐本地缺失的期号并保存
+
+    抓取在锁外进行；合并与保存持有数据锁、基于重新读取的开奖数据完成（只读开奖数据，不加载票据），
+    同时进行的多次同步（后台预取、网页更新、桌面版）不会丢掉彼此新增的开奖。
+    :return: (winnings, added, errors)，added / errors 同 sync_winnings
+    """
+    fetched, errors = fetch_missing(data.load_draw_index(), types, budget, max_age)
+    with data.write_lock():
+        winnings = data.load_winnings()
+        draws = data.load_draw_index()
+        added = {l_type: merge_new(winnings, draws, l_type, remote) for l_type, remote in fetched.items()}
+        if any(added.values()):
+            data.save_winnings(winnings)
+    return winnings, added, errors
+
+
+def settle_tickets(tickets, draws):
+    """批量兑奖并写回票据的 checked / prize（原地修改，不保存），返回本次兑奖的票据"""
+    tiers, _, _ = lottery.check_tickets_batch(tickets, draws)
+    settled = []
+    for ticket, tier in zip(tickets, tiers.tolist()):
+        if tier >= 0:
+            ticket["checked"] = True
+            ticket["prize"] = lottery.prize_name(ticket["type"], tier)
+            settled.append(ticket)
+    return settled
+
+
+def missing_draws(tickets, draws):
+    """待兑奖票据中本地还没有开奖结果的 {彩种: 期号集合}"""
+    missing = {}
+    for t in tickets:
+        if draws.find(t["type"], t["issue"]) is None:
+            missing.setdefault(t["type"], set()).add(t["issue"])
+    return missing
+
+
+def settle_pending():
+    """用本地开奖数据为所有待兑奖票据兑奖并保存
+
+    在 data.transaction() 中基于最新数据兑奖，只读取未兑奖的票据、只写回本次兑奖的票据。
+    :return: (settled, settled_test)：本次兑奖的正式票据、测试票据
+    """
+    with data.transaction() as tx:
+        draws = data.load_draw_index()
+        settled = settle_tickets(tx.unchecked(), draws)
+        settled_test = settle_tickets(tx.unchecked(is_test=True), draws)
+        tx.save_check_results(settled)
+        tx.save_check_results(settled_test, is_test=True)
+    return settled, settled_test
@@ -0,0 +1,149 @@
+"""NumPy 列式票据存储
+
+把票据按列放进 NumPy 数组（彩种编号、整数期号、红/蓝位掩码、兑奖标志、奖级、时间戳），
+首页的按彩种/期号/兑奖状态/奖级过滤、按期号分组和投注/中奖金额汇总都变成向量化运算。
+第 i 行与构建时传入的票据列表第 i 项一一对应。
+"""
+import functools
+import time
+
+import numpy as np
+
+from . import lottery
+
+BET_PER_TICKET = 2  # 每注 2 元
+
+TYPE_NAMES = lottery.LOTTERY_TYPES
+TYPE_CODES = {l_type: code for code, l_type in enumerate(TYPE_NAMES)}
+
+_TIME_FORMAT = "%Y-%m-%d %H:%M"
+
+# 按 [彩种编号, 奖级] 索引的奖金表
+PRIZE_AMOUNT_TABLE = np.zeros((len(TYPE_NAMES), len(lottery.PrizeTier)), dtype=np.int64)
+for _code, _l_type in enumerate(TYPE_NAMES):
+    _amounts = lottery.TIER_AMOUNTS[_l_type]
+    PRIZE_AMOUNT_TABLE[_code, :len(_amounts)] = _amounts
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_time(text) -> int:
+    """购买时间字符串转时间戳（秒），空值或格式不对时返回 0"""
+    if not text:
+        return 0
+    try:
+        return int(time.mktime(time.strptime(text, _TIME_FORMAT)))
+    except (TypeError, ValueError, OverflowError):
+        return 0
+
+
+class TicketStore:
+    """列式票据集合"""
+
+    def __init__(self, type_code, issue, red, blue, checked, tier, ts, other_issues=None):
+        self.other_issues = dict(other_issues or {})  # 负数编码 -> 无法转成整数的原始期号
+        self.type_code = np.asarray(type_code, dtype=np.uint8)
+        self.issue = np.asarray(issue, dtype=np.int64)
+        self.red = np.asarray(red, dtype=np.uint64)
+        self.blue = np.asarray(blue, dtype=np.uint32)
+        self.checked = np.asarray(checked, dtype=bool)
+        self.tier = np.asarray(tier, dtype=np.uint8)
+        self.ts = np.asarray(ts, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.issue)
+
+    @classmethod
+    def from_dicts(cls, tickets):
+        """由票据字典列表构建（期号无法转成整数的票据按原始期号分别记为 -1、-2……）"""
+        n = len(tickets)
+        type_code = np.empty(n, dtype=np.uint8)
+        issue = np.empty(n, dtype=np.int64)
+        red = np.empty(n, dtype=np.uint64)
+        blue = np.empty(n, dtype=np.uint32)
+        checked = np.empty(n, dtype=bool)
+        tier = np.empty(n, dtype=np.uint8)
+        ts = np.empty(n, dtype=np.int64)
+        codes = {}  # 无法转成整数的原始期号 -> 负数编码
+        for i, t in enumerate(tickets):
+            l_type = t["type"]
+            reds, blues = t["nums"]
+            type_code[i] = TYPE_CODES[l_type]
+            value = lottery.issue_to_int(t["issue"])
+            if value < 0:
+                value = codes.setdefault(str(t["issue"]), -1 - len(codes))
+            issue[i] = value
+            red[i] = lottery.nums_to_mask(reds)
+            blue[i] = lottery.nums_to_mask(blues)
+            checked[i] = bool(t.get("checked"))
+            tier[i] = lottery.prize_tier(l_type, t.get("prize"))
+            ts[i] = parse_time(t.get("time"))
+        return cls(type_code, issue, red, blue, checked, tier, ts, {code: text for text, code in codes.items()})
+
+    def filter(self, l_type=None, issue=None, checked=None, won=None):
+        """按条件返回布尔掩码，未指定的条件不参与过滤
+
+        :param won: True 只保留已兑奖且中奖的票据，False 取其补集
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if l_type is not None:
+            mask &= self.type_code == TYPE_CODES[l_type]
+        if issue is not None:
+            code = self._issue_code(issue)
+            mask &= False if code is None else self.issue == code
+        if checked is not None:
+            mask &= self.checked == bool(checked)
+        if won is not None:
+            winning = self.checked & (self.tier > 0)
+            mask &= winning if won else ~winning
+        return mask
+
+    @staticmethod
+    def indices(mask):
+        """布尔掩码转行号"""
+        return np.flatnonzero(mask)
+
+    def issues(self, l_type):
+        """某彩种购买过的全部期号（字符串）：数字期号倒序在前，无法转成整数的期号按原文排在最后"""
+        values = np.unique(self.issue[self.filter(l_type=l_type)]).tolist()
+        numeric = [str(v) for v in reversed(values) if v >= 0]
+        return numeric + sorted(self.other_issues[v] for v in values if v < 0)
+
+    def issue_text(self, code) -> str:
+        """期号列中的整数转回期号字符串"""
+        code = int(code)
+        return self.other_issues[code] if code < 0 else str(code)
+
+    def _issue_code(self, issue):
+        value = lottery.issue_to_int(issue)
+        if value >= 0:
+            return value
+        for code, text in self.other_issues.items():
+            if text == str(issue):
+                return code
+        return None
+
+    def group_by_issue(self, mask=None):
+        """按 (彩种, 期号) 分组，返回 {(l_type, issue): 行号数组}，期号倒序"""
+        rows = np.arange(len(self)) if mask is None else self.indices(mask)
+        if not len(rows):
+            return {}
+        # 以 (期号倒序, 彩种, 行号) 排序后切分
+        order = np.lexsort((rows, self.type_code[rows], -self.issue[rows]))
+        rows = rows[order]
+        keys = np.stack([self.type_code[rows].astype(np.int64), self.issue[rows]], axis=1)
+        starts = np.flatnonzero(np.any(keys[1:] != keys[:-1], axis=1)) + 1
+        groups = {}
+        for chunk in np.split(rows, starts):
+            head = chunk[0]
+            groups[(TYPE_NAMES[self.type_code[head]], self.issue_text(self.issue[head]))] = chunk
+        return groups
+
+    def total_bet(self, mask=None) -> int:
+        count = len(self) if mask is None else int(np.count_nonzero(mask))
+        return count * BET_PER_TICKET
+
+    def total_win(self, mask=None) -> int:
+        amounts = PRIZE_AMOUNT_TABLE[self.type_code, self.tier] * self.checked
+        if mask is not None:
+            amounts = amounts[mask]
+        return int(amounts.sum())
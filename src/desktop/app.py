@@ -8,7 +8,7 @@ from tkinter import ttk, messagebox, scrolledtext
 # 添加项目根目录到路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
 
-from src.common import config, data, fetcher, lottery
+from src.common import config, data, lottery, sync
 
 
 class LotteryApp:
@@ -31,6 +31,7 @@ class LotteryApp:
         self.purchased_tickets = []  # 正式购买
         self.test_tickets = []  # 测试购买（不写入正式文件）
         self.winning_data = {"ssq": [], "dlt": []}
+        self.draws = None  # 开奖期号索引（DrawIndex），保存开奖数据时由 data 模块增量更新
         self.win_tickets = []
         self.load_all_data()
 
@@ -238,6 +239,7 @@ class LotteryApp:
 
     def load_all_data(self):
         self.purchased_tickets, self.winning_data = data.load_all_data()
+        self.draws = data.load_draw_index()
         self.test_tickets = data.load_test_data()
         self.win_tickets = [
             t
@@ -245,10 +247,6 @@ class LotteryApp:
             if t.get("prize") and t.get("prize") != "未中奖"
         ]
 
-    def save_all_data(self):
-        data.save_all_data(self.purchased_tickets, self.winning_data)
-        data.save_test_data(self.test_tickets)
-
     def buy(self, l_type, is_test=False):
         try:
             n = int(self.num_entry.get())
@@ -268,26 +266,50 @@ class LotteryApp:
             if is_test
             else lottery.get_next_issue(self.winning_data, l_type)
         )
+        mode = "【测试-最新期-不保存】" if is_test else "【普通-下一期】"
+        summary = f"{n} 注 {('双色球' if l_type=='ssq' else '大乐透')} 期号：{issue} {mode}"
 
-        new_tickets = []
-        for _ in range(n):
-            ticket = lottery.generate_ticket(l_type, issue, is_test)
-            new_tickets.append(ticket)
+        if n > config.BUY_INLINE_LIMIT:
+            self._buy_bulk(l_type, issue, n, is_test, summary)
+            return
 
+        # 整批向量化生成号码；只追加新票据，不重写已有记录
+        new_tickets = lottery.generate_tickets(l_type, issue, n).to_dicts()
+        data.add_tickets(new_tickets, is_test=is_test)
         if is_test:
-            # 测试购买写入测试文件
             self.test_tickets.extend(new_tickets)
-            data.save_test_data(self.test_tickets)
-            mode = "【测试-最新期-不保存】"
         else:
-            # 正式购买写入正式文件
             self.purchased_tickets.extend(new_tickets)
-            data.save_all_data(self.purchased_tickets, self.winning_data)
-            mode = "【普通-下一期】"
 
-        self.log(
-            f"✅ 成功购买 {n} 注 {('双色球' if l_type=='ssq' else '大乐透')} 期号：{issue} {mode}"
-        )
+        self.log(f"✅ 成功购买 {summary}")
+
+    def _buy_bulk(self, l_type, issue, n, is_test, summary):
+        """大批量购买：后台线程按批向量化生成、逐批写入，完成后重新加载票据"""
+        step = max(lottery.BULK_CHUNK, n // 10)  # 大约每 10% 报告一次进度
+
+        def worker():
+            done = 0
+            try:
+                with data.bulk_write():
+                    for block in lottery.generate_ticket_chunks(l_type, issue, n):
+                        data.add_ticket_block(block, is_test=is_test)
+                        done += len(block)
+                        if done == n or done % step < len(block):
+                            self.root.after(0, lambda done=done: self.log(f"⏳ 已写入 {done} / {n} 注"))
+            except Exception as e:
+                self.root.after(
+                    0, lambda e=e, done=done: messagebox.showerror("错误", f"购买失败（已写入 {done} 注）: {e}")
+                )
+                return
+
+            def finish():
+                self.load_all_data()
+                self.log(f"✅ 成功购买 {summary}")
+
+            self.root.after(0, finish)
+
+        self.log(f"🛒 正在后台生成 {summary}…")
+        threading.Thread(target=worker, daemon=True).start()
 
     def test_buy(self):
         """同时购买两种彩票的最新一期用于测试"""
@@ -298,96 +320,75 @@ class LotteryApp:
         def worker():
             self.log("📡 正在连接中国体彩/福彩数据中心...")
             try:
-                # 增量更新：首次拉取 1000 期，以后只追加新增期次
-                for l_type in ["ssq", "dlt"]:
-                    existing = self.winning_data.get(l_type) or []
-                    if not existing:
-                        # 本地无数据，拉取最近 1000 期
-                        self.winning_data[l_type] = fetcher.fetch_500_data(l_type, limit=1000)
-                        continue
-
-                    latest_local = existing[0]["issue"]
-                    remote = fetcher.fetch_500_data(l_type, limit=200)
-                    if not remote:
-                        continue
-
-                    # 若远端最新期号与本地一致，则无需更新
-                    if remote[0]["issue"] == latest_local:
-                        continue
-
-                    # 找到本地最新期号在远端结果中的位置
-                    idx = next((i for i, r in enumerate(remote) if r["issue"] == latest_local), None)
-                    if idx is None:
-                        # 找不到，说明本地数据太旧或不连续，直接用远端+旧数据去重重建，最多保留 1000 期
-                        merged = []
-                        seen = set()
-                        for item in remote + existing:
-                            if item["issue"] in seen:
-                                continue
-                            seen.add(item["issue"])
-                            merged.append(item)
-                            if len(merged) >= 1000:
-                                break
-                        self.winning_data[l_type] = merged
-                    else:
-                        # 只在前面追加新增的若干期
-                        new_items = remote[:idx]
-                        if new_items:
-                            self.winning_data[l_type] = new_items + existing
-
-                self.save_all_data()
-                self.root.after(
-                    0,
-                    lambda: self.log(
-                        f"✨ 数据同步完成！最新期：SSQ-{self.winning_data['ssq'][0]['issue']} | DLT-{self.winning_data['dlt'][0]['issue']}"
-                    ),
+                # 增量更新：首次拉取 1000 期，以后只请求缺失的期号区间；两个彩种并发抓取。
+                # 基于最新存储合并保存，网页版同时更新时不会丢掉对方新增的开奖
+                winnings, added, errors = sync.sync()
+                if not added:
+                    raise next(iter(errors.values()))
+
+                self.root.after(0, self.load_all_data)
+                for l_type, e in errors.items():
+                    self.root.after(0, lambda l_type=l_type, e=e: self.log(f"⚠️ {l_type.upper()} 更新失败：{e}"))
+                latest = " | ".join(
+                    f"{l_type.upper()}-{winnings[l_type][0]['issue']}"
+                    for l_type in ["ssq", "dlt"]
+                    if winnings.get(l_type)
                 )
+                self.root.after(0, lambda: self.log(f"✨ 数据同步完成！最新期：{latest}"))
             except Exception as e:
                 self.root.after(0, lambda: messagebox.showerror("错误", f"更新失败: {e}"))
 
         threading.Thread(target=worker).start()
 
     def check_winnings(self):
-        # 检查正式购买和测试购买的票据
-        un_checked = [t for t in self.purchased_tickets if not t.get("checked")]
-        un_checked_test = [t for t in self.test_tickets if not t.get("checked")]
-        
-        if not un_checked and not un_checked_test:
+        # 在事务中基于最新数据兑奖并保存，网页版或后台同时兑奖时不会重复或互相覆盖；
+        # 逐张展示和动画放到事务之后，不在界面输出期间占着数据锁
+        with data.transaction() as tx:
+            self.draws = data.load_draw_index()
+            # 先检查正式购买的票据，再检查测试购买的票据
+            results = self._settle_tickets(tx.unchecked())
+            results_test = self._settle_tickets(tx.unchecked(is_test=True))
+
+            # 只写回本次兑奖的票据（测试票据的兑奖结果也保存，用于显示）
+            tx.save_check_results([t for t, result in results if result])
+            tx.save_check_results([t for t, result in results_test if result], is_test=True)
+
+        if not results and not results_test:
             self.log("💡 没有待兑奖的票据。")
             return
 
         self.log("\n🔍 开始扫描奖池进行兑奖...")
-
-        # 先检查正式购买的票据
-        for ticket in un_checked:
-            result = lottery.check_ticket(ticket, self.winning_data)
-            if result:
-                self.animate_check(ticket, result)
-                ticket["checked"] = True
-                ticket["prize"] = result["prize"]
-                if ticket["prize"] != "未中奖":
-                    self.win_tickets.append(ticket)
-            else:
-                self.log(f"⏳ 期号 {ticket['issue']} 尚未开奖，请耐心等待。")
-
-        # 再检查测试购买的票据（不保存到正式文件）
-        for ticket in un_checked_test:
-            result = lottery.check_ticket(ticket, self.winning_data)
-            if result:
-                self.animate_check(ticket, result)
-                ticket["checked"] = True
-                ticket["prize"] = result["prize"]
-                if ticket["prize"] != "未中奖":
-                    self.win_tickets.append(ticket)
-            else:
+        for ticket, result in results + results_test:
+            if result is None:
                 self.log(f"⏳ 期号 {ticket['issue']} 尚未开奖，请耐心等待。")
-
-        # 只保存正式购买的数据
-        self.save_all_data()
-        # 测试票据的兑奖结果也保存（用于显示）
-        data.save_test_data(self.test_tickets)
+                continue
+            self.animate_check(ticket, result)
+            if ticket["prize"] != "未中奖":
+                self.win_tickets.append(ticket)
+        self.load_all_data()
         self.refresh_win_summary()
 
+    def _settle_tickets(self, tickets):
+        """批量兑奖并写回票据的 checked / prize，返回 [(票据, 兑奖结果)]，尚未开奖的票据结果为 None"""
+        tiers, hits_red, hits_blue = lottery.check_tickets_batch(tickets, self.draws)
+        results = []
+        for ticket, tier, hits_r, hits_b in zip(
+            tickets, tiers.tolist(), hits_red.tolist(), hits_blue.tolist()
+        ):
+            if tier < 0:
+                results.append((ticket, None))
+                continue
+            result = {
+                "hits_red": hits_r,
+                "hits_blue": hits_b,
+                "prize": lottery.prize_name(ticket["type"], tier),
+                "winning_nums": self.draws.find(ticket["type"], ticket["issue"])["nums"],
+            }
+            ticket["checked"] = True
+            ticket["prize"] = result["prize"]
+            results.append((ticket, result))
+        return results
+
     def animate_check(self, ticket, result):
         """模拟开奖对比动画"""
         l_type = ticket["type"]
@@ -565,14 +566,7 @@ class LotteryApp:
                 return
 
             # 检查是否存在该期开奖号码
-            win_info = next(
-                (
-                    w
-                    for w in self.winning_data.get(l_type, [])
-                    if w["issue"] == issue
-                ),
-                None,
-            )
+            win_info = self.draws.find(l_type, issue)
             if not win_info:
                 messagebox.showerror("错误", f"未找到 {issue} 期的开奖号码，请确认已联网更新。")
                 return
@@ -610,7 +604,7 @@ class LotteryApp:
                     "time": "",
                     "prize": "",
                 }
-                result = lottery.check_ticket(ticket, self.winning_data)
+                result = lottery.check_ticket(ticket, self.draws)
                 if not result:
                     self.log(f"第 {idx} 行：未找到该期开奖号码。")
                     continue
@@ -642,7 +636,7 @@ class LotteryApp:
     def clear_history(self):
         if messagebox.askyesno("确认", "确定清空购票历史吗？"):
             self.purchased_tickets = []
-            self.save_all_data()
+            data.clear_tickets()
             self.result_area.delete("1.0", tk.END)
             self.log("所有历史记录已销毁。")
 
@@ -650,7 +644,7 @@ class LotteryApp:
         """清空测试购买记录（包括测试中奖记录，不影响正式购买）"""
         if messagebox.askyesno("确认", "确定清空所有测试购买记录吗？\n（包括测试中奖记录，不影响正式购买记录）"):
             self.test_tickets = []
-            data.save_test_data(self.test_tickets)
+            data.clear_tickets(is_test=True)
             self.refresh_win_summary()  # 刷新中奖汇总，移除测试中奖记录
             self.log("测试购买记录（包括中奖记录）已清空。", tag="system")
 
@@ -4,15 +4,21 @@ import sys
 import re
 from datetime import datetime
 
-from flask import Flask, flash, redirect, render_template_string, request, url_for
+from flask import Flask, flash, jsonify, redirect, render_template, request, url_for
+from jinja2 import DictLoader, FileSystemBytecodeCache
 
 # 添加项目根目录到路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
 
-from src.common import config, data, fetcher, lottery
+from src.common import config, data, jobs, lottery, number_stats, scheduler, sync
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), "..", "..", "static"))
 app.secret_key = "dev-secret"  # 如需部署可替换为更安全的值
+# 模板编译后的字节码缓存到磁盘，重启后也不必重新编译（需在注册过滤器、创建 jinja 环境之前设置）
+app.jinja_options = {
+    **app.jinja_options,
+    "bytecode_cache": FileSystemBytecodeCache(config.TEMPLATE_CACHE_DIR),
+}
 
 
 def _env_bool(name: str, default: bool = True) -> bool:
@@ -29,6 +35,53 @@ WEB_FEATURES = {
     "enable_check": _env_bool("LOTTERY_WEB_ENABLE_CHECK", True),
 }
 
+# 开奖后自动预取：允许联网更新时由 start_prefetcher() 在服务入口启动（LOTTERY_PREFETCH=0 可关闭）；
+# 只导入本模块（测试客户端、基准脚本）不会启动，也就不会联网或写入数据
+prefetcher = scheduler.PrefetchScheduler()
+
+# 耗时操作在后台任务中执行，同时运行的数量受 LOTTERY_JOB_WORKERS 限制
+job_runner = jobs.JobRunner(config.JOB_WORKERS)
+
+RECOMMEND_WINDOW = 100  # 智能推荐默认统计最近多少期
+
+
+def _recommend_window(value):
+    """解析推荐统计窗口参数，不在 number_stats.WINDOWS 中时用默认值"""
+    try:
+        window = int(value)
+    except (TypeError, ValueError):
+        return RECOMMEND_WINDOW
+    return window if window in number_stats.WINDOWS else RECOMMEND_WINDOW
+
+
+HOT_COLD_COUNT = 5  # 号码频次里列出的热号 / 冷号个数
+
+
+def _frequency_summary(table, first=None, last=None, window=RECOMMEND_WINDOW):
+    """期号 [first, last] 内的热号 / 冷号；都不传时统计最近 window 期"""
+    if first or last:
+        start, stop = table.issue_window(first or None, last or None)
+    else:
+        start, stop = 0, window
+    stop = min(stop, len(table))
+    parts = []
+    for counts in table.counts(start, stop):
+        ranked = sorted(enumerate(counts.tolist(), 1), key=lambda item: -item[1])
+        parts.append({"hot": ranked[:HOT_COLD_COUNT], "cold": ranked[::-1][:HOT_COLD_COUNT]})
+    return {
+        "first": table.issues[stop - 1] if stop > start else first,
+        "last": table.issues[start] if stop > start else last,
+        "draws": stop - start,
+        "red": parts[0],
+        "blue": parts[1],
+    }
+
+
+def start_prefetcher():
+    """启动开奖后自动预取，由服务入口调用；用其他 WSGI 服务器部署时在创建应用后调用一次"""
+    if config.PREFETCH_ENABLED and WEB_FEATURES["enable_update"] and not prefetcher.running:
+        prefetcher.start()
+
 
 def get_prize_color_class(prize):
     """根据奖项返回CSS类名"""
@@ -68,62 +121,54 @@ def fmt_money(amount):
 
 
 @app.template_filter("prize_amount")
-def prize_amount(prize):
-    """根据奖项名称返回对应的奖金金额（元）"""
-    return lottery.get_prize_amount(prize)
+def prize_amount(prize, l_type=None):
+    """根据奖项名称（及彩种）返回对应的奖金金额（元）"""
+    return lottery.get_prize_amount(prize, l_type)
+
+
+def _group_winning_tickets(store, tickets, draws):
+    """按 (彩种, 期号) 分组已中奖票据，返回 (中奖票据列表, 分组字典, 按期号倒序的分组键)"""
+    won = store.filter(won=True)
+    winning_tickets = [tickets[i] for i in store.indices(won)]
+    wins_by_issue = {}
+    for (l_type, issue), rows in store.group_by_issue(won).items():
+        win_info = draws.find(l_type, issue)
+        wins_by_issue[f"{l_type}_{issue}"] = {
+            "type": l_type,
+            "issue": issue,
+            "win_nums": win_info['nums'] if win_info else None,
+            "tickets": [tickets[i] for i in rows],
+        }
+    sorted_keys = sorted(wins_by_issue.keys(), key=lambda k: wins_by_issue[k]['issue'], reverse=True)
+    return winning_tickets, wins_by_issue, sorted_keys
 
 
 @app.route("/", methods=["GET"])
 def index():
     """首页"""
-    purchased, winnings = data.load_all_data()
-    test_tickets = data.load_test_data()
-    # 正式购买的中奖票据
-    formal_winning_tickets = [t for t in purchased if t.get("checked") and t.get("prize") and t.get("prize") != "未中奖"]
-    
-    # 按期号分组正式中奖票据
-    formal_wins_by_issue = {}
-    for t in formal_winning_tickets:
-        key = f"{t['type']}_{t['issue']}"
-        if key not in formal_wins_by_issue:
-            win_info = next((w for w in winnings.get(t['type'], []) if w['issue'] == t['issue']), None)
-            formal_wins_by_issue[key] = {
-                "type": t['type'],
-                "issue": t['issue'],
-                "win_nums": win_info['nums'] if win_info else None,
-                "tickets": []
-            }
-        formal_wins_by_issue[key]["tickets"].append(t)
-    
-    # 排序键（按期号倒序）
-    sorted_issue_keys = sorted(formal_wins_by_issue.keys(), key=lambda k: formal_wins_by_issue[k]['issue'], reverse=True)
+    # 列式视图：过滤、分组、汇总都是向量化运算，第 i 行对应 purchased[i]
+    purchased, store = data.load_tickets_with_store()
+    test_tickets, test_store = data.load_tickets_with_store(is_test=True)
+    winnings = data.load_winnings()
+    draws = data.load_draw_index()
+
+    # 正式购买的中奖票据（按期号分组）
+    formal_winning_tickets, formal_wins_by_issue, sorted_issue_keys = _group_winning_tickets(
+        store, purchased, draws
+    )
 
     # 测试购买的中奖票据（分开显示）
-    test_winning_tickets = [t for t in test_tickets if t.get("checked") and t.get("prize") and t.get("prize") != "未中奖"]
-    
-    # 按期号分组测试中奖票据
-    test_wins_by_issue = {}
-    for t in test_winning_tickets:
-        key = f"{t['type']}_{t['issue']}"
-        if key not in test_wins_by_issue:
-            win_info = next((w for w in winnings.get(t['type'], []) if w['issue'] == t['issue']), None)
-            test_wins_by_issue[key] = {
-                "type": t['type'],
-                "issue": t['issue'],
-                "win_nums": win_info['nums'] if win_info else None,
-                "tickets": []
-            }
-        test_wins_by_issue[key]["tickets"].append(t)
-    
-    sorted_test_issue_keys = sorted(test_wins_by_issue.keys(), key=lambda k: test_wins_by_issue[k]['issue'], reverse=True)
+    test_winning_tickets, test_wins_by_issue, sorted_test_issue_keys = _group_winning_tickets(
+        test_store, test_tickets, draws
+    )
 
     # 获取所有购买记录的期号
-    ssq_issues = sorted(list(set(t['issue'] for t in purchased if t['type'] == 'ssq')), reverse=True)
-    dlt_issues = sorted(list(set(t['issue'] for t in purchased if t['type'] == 'dlt')), reverse=True)
+    ssq_issues = store.issues("ssq")
+    dlt_issues = store.issues("dlt")
 
     # === 账户投注 / 中奖统计（仅统计正式购买） ===
-    total_bet = len(purchased) * 2  # 每注 2 元
-    total_win = sum(lottery.get_prize_amount(t.get("prize")) for t in purchased)
+    total_bet = store.total_bet()  # 每注 2 元
+    total_win = store.total_win()
     net_profit = total_win - total_bet
 
     # === 我的彩票记录：按期号分页 ===
@@ -131,9 +176,8 @@ def index():
     def _default_page_for_type(issues, l_type):
         if not issues:
             return 1
-        opened_issues = {w["issue"] for w in winnings.get(l_type, [])}
         for idx, iss in enumerate(issues, start=1):
-            if iss in opened_issues:
+            if draws.find(l_type, iss) is not None:
                 return idx
         return 1
 
@@ -159,22 +203,16 @@ def index():
     # 双色球分页
     ssq_current_issue, ssq_page, ssq_total = _get_issue_page(ssq_issues, "ssq_page", "ssq")
     ssq_current_tickets = [
-        t for t in purchased if t["type"] == "ssq" and t["issue"] == ssq_current_issue
+        purchased[i] for i in store.indices(store.filter("ssq", ssq_current_issue))
     ] if ssq_current_issue else []
-    ssq_current_win = next(
-        (w for w in winnings.get("ssq", []) if w["issue"] == ssq_current_issue),
-        None,
-    ) if ssq_current_issue else None
+    ssq_current_win = draws.find("ssq", ssq_current_issue) if ssq_current_issue else None
 
     # 大乐透分页
     dlt_current_issue, dlt_page, dlt_total = _get_issue_page(dlt_issues, "dlt_page", "dlt")
     dlt_current_tickets = [
-        t for t in purchased if t["type"] == "dlt" and t["issue"] == dlt_current_issue
+        purchased[i] for i in store.indices(store.filter("dlt", dlt_current_issue))
     ] if dlt_current_issue else []
-    dlt_current_win = next(
-        (w for w in winnings.get("dlt", []) if w["issue"] == dlt_current_issue),
-        None,
-    ) if dlt_current_issue else None
+    dlt_current_win = draws.find("dlt", dlt_current_issue) if dlt_current_issue else None
 
     # 准备开奖号码映射 { 'ssq_issue': [nums], ... }
     issue_win_map = {}
@@ -185,18 +223,31 @@ def index():
 
     # 智能推荐：根据 query 参数决定是否生成推荐号码
     analyze_type = request.args.get("analyze_type")
+    window = _recommend_window(request.args.get("window"))
     recommendations = None
     if analyze_type in {"ssq", "dlt"} and winnings.get(analyze_type):
         try:
             target_issue = lottery.get_next_issue(winnings, analyze_type)
-            rec_items = []
-            for i in range(10):
-                nums = lottery.generate_recommended_nums(winnings, analyze_type, history_count=100)
-                rec_items.append({"index": i, "nums": nums})
+            # 权重直接读增量维护的号码统计，10 组推荐一次向量化抽出
+            weights = data.load_number_stats().weights(analyze_type, window)
+            block = lottery.generate_tickets(analyze_type, target_issue, 10, weights=weights)
+            rec_items = [
+                {"index": i, "nums": [reds, blues]}
+                for i, (reds, blues) in enumerate(zip(block.red.tolist(), block.blue.tolist()))
+            ]
             recommendations = {
                 "type": analyze_type,
                 "issue": target_issue,
+                "window": window,
+                "windows": number_stats.WINDOWS,
                 "items": rec_items,
+                # 任意期号区间的热号 / 冷号：前缀和表上一次相减即可得到
+                "frequency": _frequency_summary(
+                    data.load_frequency_table(analyze_type),
+                    request.args.get("freq_from", "").strip(),
+                    request.args.get("freq_to", "").strip(),
+                    window,
+                ),
             }
         except Exception:
             recommendations = None
@@ -226,8 +277,8 @@ def index():
             iss = history[i]["issue"]
             buy_options[l_type]["test"].append({"value": iss, "label": f"第 {iss} 期"})
 
-    return render_template_string(
-        TEMPLATE,
+    return render_template(
+        "index.html",
         purchased=purchased,
         test_tickets=test_tickets,
         formal_winning_tickets=formal_winning_tickets,
@@ -251,6 +302,7 @@ def index():
         issue_win_map=issue_win_map,
         buy_options=buy_options,
         features=WEB_FEATURES,
+        jobs=job_runner.jobs(limit=5),
         total_bet=total_bet,
         total_win=total_win,
         net_profit=net_profit,
@@ -264,51 +316,37 @@ def update():
     if not WEB_FEATURES["enable_update"]:
         flash("该功能在网页版已被管理员关闭。", "warning")
         return redirect(url_for("index"))
-    purchased, winnings = data.load_all_data()
-    try:
-        for l_type in ["ssq", "dlt"]:
-            existing = winnings.get(l_type) or []
-            if not existing:
-                # 本地无数据：一次性拉取最近 1000 期
-                winnings[l_type] = fetcher.fetch_500_data(l_type, limit=1000)
-                continue
-
-            latest_local = existing[0]["issue"]
-            remote = fetcher.fetch_500_data(l_type, limit=200)
-            if not remote:
-                continue
-
-            # 已经最新则不更新
-            if remote[0]["issue"] == latest_local:
-                continue
-
-            # 找到本地最新期号在远端中的位置
-            idx = next((i for i, r in enumerate(remote) if r["issue"] == latest_local), None)
-            if idx is None:
-                # 太久没更新，合并去重，最多保留 1000 期
-                merged = []
-                seen = set()
-                for item in remote + existing:
-                    if item["issue"] in seen:
-                        continue
-                    seen.add(item["issue"])
-                    merged.append(item)
-                    if len(merged) >= 1000:
-                        break
-                winnings[l_type] = merged
-            else:
-                new_items = remote[:idx]
-                if new_items:
-                    winnings[l_type] = new_items + existing
+    _submit("update", "联网更新", _update_job)
+    return redirect(url_for("index"))
 
-        data.save_all_data(purchased, winnings)
-        flash(
-            f"更新成功！最新期：SSQ-{winnings['ssq'][0]['issue']} | DLT-{winnings['dlt'][0]['issue']}",
+
+def _update_job(job):
+    job.progress(0, message="正在联网更新开奖数据…")
+    # 只抓取本地缺失的期号区间（两个彩种并发），有新增时才写回
+    winnings, added, errors = sync.sync()
+    if len(errors) == len(lottery.LOTTERY_TYPES):
+        raise next(iter(errors.values()))
+    if errors:
+        failed = "、".join(f"{l_type.upper()}（{e}）" for l_type, e in errors.items())
+        job.notify(f"部分更新成功，以下彩种更新失败：{failed}", "warning")
+    else:
+        new_count = sum(len(issues) for issues in added.values())
+        job.notify(
+            f"更新成功！新增 {new_count} 期，最新期：SSQ-{winnings['ssq'][0]['issue']} | DLT-{winnings['dlt'][0]['issue']}",
             "success",
         )
-    except Exception as e:
-        flash(f"更新失败: {e}", "error")
-    return redirect(url_for("index"))
+    return {l_type: len(issues) for l_type, issues in added.items()}
+
+
+def _submit(name, label, func, *args):
+    """提交后台任务并提示用户；同种任务还在进行时不重复提交"""
+    job = job_runner.active(name)
+    if job is not None:
+        flash(f"{label}已在进行中（任务 {job.id}）。", "info")
+        return job
+    job = job_runner.submit(name, label, func, *args)
+    flash(f"{label}已提交到后台（任务 {job.id}），完成后页面会自动刷新。", "info")
+    return job
 
 
 @app.post("/buy")
@@ -321,7 +359,7 @@ def buy():
     count = request.form.get("count", "1")
     is_test = request.form.get("mode") == "test"
 
-    purchased, winnings = data.load_all_data()
+    winnings = data.load_winnings()
     try:
         n = max(1, int(count))  # 移除上限限制
     except Exception:
@@ -343,22 +381,9 @@ def buy():
             else lottery.get_next_issue(winnings, l_type)
         )
     
-    new_tickets = []
-    for _ in range(n):
-        ticket = lottery.generate_ticket(l_type, issue, is_test)
-        new_tickets.append(ticket)
-
     if is_test:
-        # 测试购买写入测试文件
-        test_tickets = data.load_test_data()
-        test_tickets.extend(new_tickets)
-        data.save_test_data(test_tickets)
         mode_str = "测试(不保存)"
     else:
-        # 正式购买写入正式文件
-        purchased.extend(new_tickets)
-        data.save_all_data(purchased, winnings)
-        
         # 判断是下一期还是未来期
         try:
             next_iss = lottery.get_next_issue(winnings, l_type)
@@ -372,13 +397,35 @@ def buy():
         except:
             mode_str = "正式购买"
 
-    flash(
-        f"成功购买 {n} 注 {'双色球' if l_type=='ssq' else '大乐透'} [{issue}] ({mode_str})",
-        "success",
-    )
+    summary = f"{n} 注 {'双色球' if l_type=='ssq' else '大乐透'} [{issue}] ({mode_str})"
+    if n > config.BUY_INLINE_LIMIT:
+        # 大批量购买交给后台任务分批生成、逐批写入，不占用请求线程
+        job = job_runner.submit("buy", f"购买 {summary}", _buy_job, l_type, issue, n, is_test)
+        flash(f"购买 {summary} 已提交到后台（任务 {job.id}），完成后页面会自动刷新。", "info")
+        return redirect(url_for("index"))
+
+    # 整批向量化生成号码；只追加新票据，不重写已有记录
+    new_tickets = lottery.generate_tickets(l_type, issue, n).to_dicts()
+    data.add_tickets(new_tickets, is_test=is_test)
+    flash(f"成功购买 {summary}", "success")
     return redirect(url_for("index"))
 
 
+def _buy_job(job, l_type, issue, n, is_test, weights=None):
+    # 号码按批向量化生成（给出 weights 时按推荐权重抽取），每批写入后即释放，内存与总注数无关
+    done = 0
+    job.progress(0, n)
+    with data.bulk_write():
+        for block in lottery.generate_ticket_chunks(l_type, issue, n, weights=weights):
+            if job.cancelled:
+                raise jobs.JobCancelled(f"{job.label}已取消，已写入的 {done} 注保留")
+            data.add_ticket_block(block, is_test=is_test)
+            done += len(block)
+            job.progress(done, n, f"已写入 {done} / {n} 注")
+    job.notify(f"成功{job.label}", "success")
+    return n
+
+
 @app.post("/buy_recommend")
 def buy_recommend():
     """购买智能推荐的号码（正式购买，带推荐标记）"""
@@ -389,16 +436,21 @@ def buy_recommend():
     l_type = request.form.get("type")
     issue = request.form.get("issue")
     chosen = request.form.getlist("choose")
+    bulk_count = request.form.get("bulk_count", "").strip()
+    window = _recommend_window(request.form.get("window"))
 
     if not l_type or l_type not in {"ssq", "dlt"}:
         flash("无效的彩种类型。", "error")
         return redirect(url_for("index"))
 
+    if bulk_count:
+        return _buy_recommend_bulk(l_type, issue, bulk_count, window)
+
     if not chosen:
         flash("请至少选择一组推荐号码。", "warning")
         return redirect(url_for("index", analyze_type=l_type) + "#recommend")
 
-    purchased, winnings = data.load_all_data()
+    winnings = data.load_winnings()
     if not winnings.get(l_type):
         flash("请先联网更新获取开奖数据。", "warning")
         return redirect(url_for("index"))
@@ -428,8 +480,7 @@ def buy_recommend():
         flash("解析推荐号码失败，未生成任何有效注数。", "error")
         return redirect(url_for("index", analyze_type=l_type) + "#recommend")
 
-    purchased.extend(new_tickets)
-    data.save_all_data(purchased, winnings)
+    data.add_tickets(new_tickets)
 
     flash(
         f"已根据智能推荐成功购买 {len(new_tickets)} 注 {'双色球' if l_type=='ssq' else '大乐透'} [第 {issue} 期]（已标记为推荐）",
@@ -438,99 +489,161 @@ def buy_recommend():
     return redirect(url_for("index") + "#records")
 
 
+def _buy_recommend_bulk(l_type, issue, count, window=RECOMMEND_WINDOW):
+    """按最近 window 期的推荐权重批量生成并购买 count 注（正式购买，带推荐标记）"""
+    try:
+        n = max(1, int(count))
+    except ValueError:
+        flash("请输入有效的注数（至少1注）", "error")
+        return redirect(url_for("index", analyze_type=l_type) + "#recommend")
+
+    winnings = data.load_winnings()
+    if not winnings.get(l_type):
+        flash("请先联网更新获取开奖数据。", "warning")
+        return redirect(url_for("index"))
+    if not issue:
+        issue = lottery.get_next_issue(winnings, l_type)
+
+    weights = data.load_number_stats().weights(l_type, window)
+    summary = f"{n} 注 {'双色球' if l_type=='ssq' else '大乐透'} [第 {issue} 期]（推荐号码）"
+    if n > config.BUY_INLINE_LIMIT:
+        job = job_runner.submit("buy", f"购买 {summary}", _buy_job, l_type, issue, n, False, weights)
+        flash(f"购买 {summary} 已提交到后台（任务 {job.id}），完成后页面会自动刷新。", "info")
+        return redirect(url_for("index"))
+
+    data.add_tickets(lottery.generate_tickets(l_type, issue, n, weights=weights).to_dicts())
+    flash(f"已根据智能推荐成功购买 {summary}", "success")
+    return redirect(url_for("index") + "#records")
+
+
 @app.post("/check")
 def check():
     """批量兑奖"""
     if not WEB_FEATURES["enable_check"]:
         flash("该功能在网页版已被管理员关闭。", "warning")
         return redirect(url_for("index"))
-    purchased, winnings = data.load_all_data()
-    test_tickets = data.load_test_data()
-    
-    un_checked = [t for t in purchased if not t.get("checked")]
-    un_checked_test = [t for t in test_tickets if not t.get("checked")]
-    
-    if not un_checked and not un_checked_test:
+    if not data.load_unchecked_tickets() and not data.load_unchecked_tickets(is_test=True):
         flash("没有待兑奖的票据。", "info")
         return redirect(url_for("index"))
+    _submit("check", "兑奖", _check_job, WEB_FEATURES["enable_update"])
+    return redirect(url_for("index"))
 
-    # 自动更新检查：如果待兑奖票据的期号在本地没有开奖结果，尝试更新一次
-    need_update = False
-    all_unchecked_tickets = un_checked + un_checked_test
-    for t in all_unchecked_tickets:
-        l_type = t["type"]
-        issue = t["issue"]
-        # 检查该期号是否存在于winnings中
-        has_result = any(w["issue"] == issue for w in winnings.get(l_type, []))
-        if not has_result:
-            need_update = True
-            break
-    
-    if need_update and WEB_FEATURES["enable_update"]:
+
+def _check_job(job, allow_update):
+    # 先用本地已有的开奖数据兑奖（正式与测试票据分别向量化比对）
+    job.progress(0, message="正在兑奖…")
+    settled, settled_test = sync.settle_pending()
+    count = len(settled) + len(settled_test)
+
+    # 本地缺少开奖结果的票据：补齐开奖数据后再兑一次
+    waiting = data.load_unchecked_tickets() + data.load_unchecked_tickets(is_test=True)
+    if allow_update and sync.missing_draws(waiting, data.load_draw_index()):
+        job.check_cancelled()
+        job.progress(count, message=f"已兑奖 {count} 张，正在获取缺少的开奖数据…")
         try:
-            # 尝试更新数据
-            for l_type in ["ssq", "dlt"]:
-                existing = winnings.get(l_type) or []
-                if not existing:
-                    winnings[l_type] = fetcher.fetch_500_data(l_type, limit=1000)
-                    continue
-
-                latest_local = existing[0]["issue"]
-                remote = fetcher.fetch_500_data(l_type, limit=200)
-                if not remote:
-                    continue
-                if remote[0]["issue"] == latest_local:
-                    continue
-
-                idx = next((i for i, r in enumerate(remote) if r["issue"] == latest_local), None)
-                if idx is None:
-                    merged = []
-                    seen = set()
-                    for item in remote + existing:
-                        if item["issue"] in seen:
-                            continue
-                        seen.add(item["issue"])
-                        merged.append(item)
-                        if len(merged) >= 1000:
-                            break
-                    winnings[l_type] = merged
-                else:
-                    new_items = remote[:idx]
-                    if new_items:
-                        winnings[l_type] = new_items + existing
-            # 保存更新后的开奖数据(此时还不保存purchased状态，下面统一保存)
-            # 注意：data.save_all_data需要purchased参数，这里暂时不保存，等兑奖完了一起保存
-            # 但为了防止check_ticket用到旧数据，我们已经更新了winnings变量
+            sync.sync()
         except Exception:
-            pass # 更新失败则忽略，继续用本地数据兑奖
-
-    checked_any = False
-    # 检查正式购买的票据
-    for ticket in un_checked:
-        result = lottery.check_ticket(ticket, winnings)
-        if result:
-            ticket["checked"] = True
-            ticket["prize"] = result["prize"]
-            checked_any = True
-
-    # 检查测试购买的票据
-    for ticket in un_checked_test:
-        result = lottery.check_ticket(ticket, winnings)
-        if result:
-            ticket["checked"] = True
-            ticket["prize"] = result["prize"]
-            checked_any = True
-
-    data.save_all_data(purchased, winnings)
-    data.save_test_data(test_tickets)
-    
-    if checked_any:
-        flash("兑奖完成，已更新中奖结果。", "success")
+            pass  # 更新失败则忽略，已兑奖的结果保留
+        settled, settled_test = sync.settle_pending()
+        count += len(settled) + len(settled_test)
+
+    job.progress(count)
+    if count:
+        job.notify(f"兑奖完成，已更新 {count} 张票据的中奖结果。", "success")
+    else:
+        job.notify("未找到匹配的开奖结果，可能尚未开奖。", "warning")
+    return count
+
+
+@app.route("/jobs")
+def job_list():
+    """最近的后台任务"""
+    return jsonify([job.to_dict() for job in job_runner.jobs()])
+
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    """单个后台任务的状态、进度与结果"""
+    job = job_runner.get(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在或已过期"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.post("/jobs/<job_id>/cancel")
+def cancel_job(job_id):
+    """取消后台任务"""
+    if job_runner.cancel(job_id):
+        flash("已请求取消任务。", "info")
     else:
-        flash("未找到匹配的开奖结果，可能尚未开奖。", "warning")
+        flash("任务不存在或已经结束。", "warning")
     return redirect(url_for("index"))
 
 
+@app.route("/status")
+def status():
+    """后台同步进度与仍在等待开奖数据的票据数"""
+    draws = data.load_draw_index()
+    tickets = data.load_unchecked_tickets() + data.load_unchecked_tickets(is_test=True)
+    waiting = sync.missing_draws(tickets, draws)
+    return jsonify(
+        {
+            "sync": prefetcher.status(),
+            "jobs": [job.to_dict() for job in job_runner.jobs() if job.active],
+            "waiting": {l_type: sorted(issues) for l_type, issues in waiting.items()},
+            "latest": {l_type: (draws.latest(l_type) or {}).get("issue") for l_type in lottery.LOTTERY_TYPES},
+        }
+    )
+
+
+@app.route("/omission")
+def omission():
+    """号码遗漏统计（当前 / 最大 / 平均遗漏与连开），?type=ssq|dlt 只返回一个彩种"""
+    l_type = request.args.get("type")
+    if l_type and l_type not in lottery.LOTTERY_TYPES:
+        return jsonify({"error": "无效的彩种类型"}), 400
+    stats = data.load_omission_stats()
+    if l_type:
+        return jsonify(stats.summary(l_type))
+    return jsonify({t: stats.summary(t) for t in lottery.LOTTERY_TYPES})
+
+
+@app.route("/cooccurrence")
+def cooccurrence():
+    """红球同出统计，供图表使用
+
+    参数：type（ssq|dlt）、window（最近多少期，默认全部）、number（只看与该号码同出的号码和组合）、limit（组合个数，默认 10）。
+    不传 number 时返回完整的两两同出矩阵。
+    """
+    l_type = request.args.get("type", "ssq")
+    if l_type not in lottery.LOTTERY_TYPES:
+        return jsonify({"error": "无效的彩种类型"}), 400
+    index = data.load_cooccurrence(l_type)
+    # 无法解析的参数按未传处理
+    window = request.args.get("window", type=int)
+    number = request.args.get("number", type=int)
+    limit = max(0, request.args.get("limit", 10, type=int))
+    if number is not None and not 1 <= number <= index.max_number:
+        return jsonify({"error": f"号码应在 1-{index.max_number} 之间"}), 400
+
+    result = {
+        "type": l_type,
+        "latest": index.latest,
+        "draws": index.window(window),
+        "number": number,
+        "triples": [
+            {"numbers": list(nums), "count": count} for nums, count in index.top_triples(window, limit, number)
+        ],
+    }
+    if number is None:
+        result["pairs"] = index.pairs(window).tolist()
+    else:
+        result["partners"] = [
+            {"number": n, "count": count} for n, count in index.top_partners(number, window, index.max_number)
+        ]
+    return jsonify(result)
+
+
 @app.post("/verify")
 def verify():
     """自定义选号验奖"""
@@ -542,7 +655,7 @@ def verify():
     issue = request.form.get("verify_issue", "").strip()
     numbers_text = request.form.get("verify_numbers", "").strip()
     
-    purchased, winnings = data.load_all_data()
+    winnings = data.load_winnings()
     
     if not winnings.get(l_type):
         flash("请先联网更新获取开奖数据", "warning")
@@ -557,7 +670,8 @@ def verify():
         return redirect(url_for("index"))
     
     # 查找对应期号的开奖结果
-    win_info = next((w for w in winnings[l_type] if w["issue"] == issue), None)
+    draws = data.load_draw_index()
+    win_info = draws.find(l_type, issue)
     if not win_info:
         flash(f"未找到期号 {issue} 的开奖结果", "warning")
         return redirect(url_for("index"))
@@ -600,7 +714,7 @@ def verify():
             
             # 检查号码
             ticket = {"type": l_type, "issue": issue, "nums": nums}
-            result = lottery.check_ticket(ticket, winnings)
+            result = lottery.check_ticket(ticket, draws)
             if result:
                 results.append({
                     "nums": nums,
@@ -641,21 +755,21 @@ def analyze():
     if l_type not in {"ssq", "dlt"}:
         l_type = "dlt"
 
-    purchased, winnings = data.load_all_data()
-    test_tickets = data.load_test_data()
+    winnings = data.load_winnings()
+    draws = data.load_draw_index()
 
     if not winnings.get(l_type):
         flash("暂无开奖数据，请先点击“立即更新数据”。", "warning")
         return redirect(url_for("index"))
 
-    # 生成 10 组推荐号码
+    # 生成 10 组推荐号码（权重读增量维护的号码统计，一次向量化抽出）
+    weights = data.load_number_stats().weights(l_type, RECOMMEND_WINDOW)
+    block = lottery.generate_tickets(l_type, lottery.get_next_issue(winnings, l_type), 10, weights=weights)
     recommended_groups = []
-    for _ in range(10):
-        nums = lottery.generate_recommended_nums(winnings, l_type, history_count=100)
-        reds, blues = nums
+    for reds, blues in zip(block.red.tolist(), block.blue.tolist()):
         recommended_groups.append(
             {
-                "nums": nums,
+                "nums": [reds, blues],
                 "red_str": " ".join(f"{n:02d}" for n in reds),
                 "blue_str": " ".join(f"{n:02d}" for n in blues),
             }
@@ -664,48 +778,21 @@ def analyze():
     # 重新渲染首页，但携带推荐结果（其余逻辑与 index 基本一致）
     # --- 以下逻辑与 index() 中相同，只是多传了 recommended_groups / analyze_type ---
 
-    # 正式购买的中奖票据
-    formal_winning_tickets = [t for t in purchased if t.get("checked") and t.get("prize") and t.get("prize") != "未中奖"]
-    
-    # 按期号分组正式中奖票据
-    formal_wins_by_issue = {}
-    for t in formal_winning_tickets:
-        key = f"{t['type']}_{t['issue']}"
-        if key not in formal_wins_by_issue:
-            win_info = next((w for w in winnings.get(t['type'], []) if w['issue'] == t['issue']), None)
-            formal_wins_by_issue[key] = {
-                "type": t['type'],
-                "issue": t['issue'],
-                "win_nums": win_info['nums'] if win_info else None,
-                "tickets": []
-            }
-        formal_wins_by_issue[key]["tickets"].append(t)
-    
-    sorted_issue_keys = sorted(formal_wins_by_issue.keys(), key=lambda k: formal_wins_by_issue[k]['issue'], reverse=True)
+    purchased, store = data.load_tickets_with_store()
+    test_tickets, test_store = data.load_tickets_with_store(is_test=True)
 
-    # 测试购买的中奖票据（分开显示）
-    test_winning_tickets = [t for t in test_tickets if t.get("checked") and t.get("prize") and t.get("prize") != "未中奖"]
-    
-    test_wins_by_issue = {}
-    for t in test_winning_tickets:
-        key = f"{t['type']}_{t['issue']}"
-        if key not in test_wins_by_issue:
-            win_info = next((w for w in winnings.get(t['type'], []) if w['issue'] == t['issue']), None)
-            test_wins_by_issue[key] = {
-                "type": t['type'],
-                "issue": t['issue'],
-                "win_nums": win_info['nums'] if win_info else None,
-                "tickets": []
-            }
-        test_wins_by_issue[key]["tickets"].append(t)
-    
-    sorted_test_issue_keys = sorted(test_wins_by_issue.keys(), key=lambda k: test_wins_by_issue[k]['issue'], reverse=True)
+    formal_winning_tickets, formal_wins_by_issue, sorted_issue_keys = _group_winning_tickets(
+        store, purchased, draws
+    )
+    test_winning_tickets, test_wins_by_issue, sorted_test_issue_keys = _group_winning_tickets(
+        test_store, test_tickets, draws
+    )
 
-    ssq_issues = sorted(list(set(t['issue'] for t in purchased if t['type'] == 'ssq')), reverse=True)
-    dlt_issues = sorted(list(set(t['issue'] for t in purchased if t['type'] == 'dlt')), reverse=True)
+    ssq_issues = store.issues("ssq")
+    dlt_issues = store.issues("dlt")
 
-    total_bet = len(purchased) * 2
-    total_win = sum(lottery.get_prize_amount(t.get("prize")) for t in purchased)
+    total_bet = store.total_bet()
+    total_win = store.total_win()
     net_profit = total_win - total_bet
 
     def _get_issue_page(issues, param_name):
@@ -724,21 +811,15 @@ def analyze():
 
     ssq_current_issue, ssq_page, ssq_total = _get_issue_page(ssq_issues, "ssq_page")
     ssq_current_tickets = [
-        t for t in purchased if t["type"] == "ssq" and t["issue"] == ssq_current_issue
+        purchased[i] for i in store.indices(store.filter("ssq", ssq_current_issue))
     ] if ssq_current_issue else []
-    ssq_current_win = next(
-        (w for w in winnings.get("ssq", []) if w["issue"] == ssq_current_issue),
-        None,
-    ) if ssq_current_issue else None
+    ssq_current_win = draws.find("ssq", ssq_current_issue) if ssq_current_issue else None
 
     dlt_current_issue, dlt_page, dlt_total = _get_issue_page(dlt_issues, "dlt_page")
     dlt_current_tickets = [
-        t for t in purchased if t["type"] == "dlt" and t["issue"] == dlt_current_issue
+        purchased[i] for i in store.indices(store.filter("dlt", dlt_current_issue))
     ] if dlt_current_issue else []
-    dlt_current_win = next(
-        (w for w in winnings.get("dlt", []) if w["issue"] == dlt_current_issue),
-        None,
-    ) if dlt_current_issue else None
+    dlt_current_win = draws.find("dlt", dlt_current_issue) if dlt_current_issue else None
 
     issue_win_map = {}
     for w in winnings.get('ssq', []):
@@ -764,8 +845,8 @@ def analyze():
             iss = history[i]["issue"]
             buy_options[lt]["test"].append({"value": iss, "label": f"第 {iss} 期"})
 
-    return render_template_string(
-        TEMPLATE,
+    return render_template(
+        "index.html",
         purchased=purchased,
         test_tickets=test_tickets,
         formal_winning_tickets=formal_winning_tickets,
@@ -788,6 +869,7 @@ def analyze():
         issue_win_map=issue_win_map,
         buy_options=buy_options,
         features=WEB_FEATURES,
+        jobs=job_runner.jobs(limit=5),
         total_bet=total_bet,
         total_win=total_win,
         net_profit=net_profit,
@@ -800,7 +882,7 @@ def analyze():
 @app.post("/clear_test")
 def clear_test():
     """清空测试购买记录（不影响正式购买）"""
-    data.save_test_data([])
+    data.clear_tickets(is_test=True)
     flash("测试购买记录已清空。", "success")
     return redirect(url_for("index"))
 
@@ -808,9 +890,9 @@ def clear_test():
 @app.route("/history")
 def history():
     """所有开奖结果页面"""
-    purchased, winnings = data.load_all_data()
-    return render_template_string(
-        HISTORY_TEMPLATE,
+    winnings = data.load_winnings()
+    return render_template(
+        "history.html",
         winnings=winnings,
         now=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
     )
@@ -937,6 +1019,13 @@ TEMPLATE = """
     /* Pagination / Issue selector */
     .pagination { display: flex; align-items: center; justify-content: flex-end; gap: 8px; font-size: 13px; margin-bottom: 8px; color: #666; }
     .pagination select { min-width: 140px; }
+
+    /* Background jobs */
+    .job-item { margin-top: 8px; padding: 8px 10px; border-radius: 6px; background: #fafafa; font-size: 13px; }
+    .job-head { display: flex; align-items: center; justify-content: space-between; gap: 8px; }
+    .job-bar { height: 6px; margin-top: 6px; border-radius: 3px; background: #f0f0f0; overflow: hidden; }
+    .job-bar div { height: 100%; background: var(--primary); }
+    .job-msg { margin-top: 4px; color: #666; }
   </style>
   <script>
     var buyOptions = {{ buy_options|tojson }};
@@ -1030,9 +1119,26 @@ TEMPLATE = """
         switchHistoryTab(active);
     }
 
+    // 有后台任务在进行时轮询进度，全部结束后刷新页面显示结果
+    function pollJobs() {
+        var list = document.querySelector('.job-list');
+        if (!list || list.getAttribute('data-active') === '0') {
+            return;
+        }
+        var timer = setInterval(function () {
+            fetch('{{ url_for("job_list") }}').then(function (r) { return r.json(); }).then(function (jobs) {
+                if (!jobs.some(function (j) { return j.state === 'queued' || j.state === 'running'; })) {
+                    clearInterval(timer);
+                    window.location.reload();
+                }
+            });
+        }, 1500);
+    }
+
     window.addEventListener('DOMContentLoaded', function () {
         updateBuyIssues();
         initHistoryTab();
+        pollJobs();
     });
   </script>
 </head>
@@ -1100,6 +1206,32 @@ TEMPLATE = """
                   <button class="btn btn-ghost btn-block" type="button" disabled>更新已关闭</button>
                 {% endif %}
             </form>
+
+            {% if jobs %}
+            <div class="job-list" data-active="{{ jobs|selectattr('active')|list|length }}">
+                <div class="info-label" style="margin-top: 16px;">后台任务</div>
+                {% for job in jobs %}
+                <div class="job-item">
+                    <div class="job-head">
+                        <span>{{ job.label }}</span>
+                        {% if job.active %}
+                          <form method="post" action="{{ url_for('cancel_job', job_id=job.id) }}" style="margin:0;">
+                            <button class="btn btn-ghost btn-sm" type="submit">取消</button>
+                          </form>
+                        {% endif %}
+                    </div>
+                    {% if job.active %}
+                      {% if job.total %}
+                        <div class="job-bar"><div style="width: {{ (100 * job.done / job.total)|round|int }}%;"></div></div>
+                      {% endif %}
+                      <div class="job-msg">{{ job.message or ("排队中…" if job.state == "queued" else "进行中…") }}</div>
+                    {% else %}
+                      <div class="job-msg flash-{{ job.level }}">{{ job.message }}</div>
+                    {% endif %}
+                </div>
+                {% endfor %}
+            </div>
+            {% endif %}
             
             <div style="margin-top: 12px; display:flex; gap:8px;">
                 <form method="get" action="{{ url_for('index') }}" style="flex:1; margin:0;">
@@ -1201,6 +1333,34 @@ TEMPLATE = """
     <div id="recommend" class="card table-card">
         <div class="card-title">
             <span>智能推荐 · {{ '双色球' if recommendations.type=='ssq' else '大乐透' }} 第 {{ recommendations.issue }} 期</span>
+            <span style="font-size: 13px; font-weight: normal;">
+                统计最近
+                {% for w in recommendations.windows %}
+                {% if w == recommendations.window %}<strong>{{ w }}</strong>{% else %}<a href="{{ url_for('index', analyze_type=recommendations.type, window=w) }}#recommend">{{ w }}</a>{% endif %}
+                {% endfor %}
+                期
+            </span>
+        </div>
+        {% set freq = recommendations.frequency %}
+        <div style="margin-bottom: 12px; font-size: 13px; color:#666;">
+            <form method="get" action="{{ url_for('index') }}" style="display:flex; gap:8px; align-items:center; margin-bottom: 8px;">
+                <input type="hidden" name="analyze_type" value="{{ recommendations.type }}">
+                <input type="hidden" name="window" value="{{ recommendations.window }}">
+                <span>号码频次：第</span>
+                <input type="text" name="freq_from" value="{{ freq.first or '' }}" style="width: 90px;">
+                <span>至</span>
+                <input type="text" name="freq_to" value="{{ freq.last or '' }}" style="width: 90px;">
+                <span>期（共 {{ freq.draws }} 期）</span>
+                <button class="btn btn-ghost" type="submit">统计</button>
+            </form>
+            {% for part, color in [(freq.red, 'red'), (freq.blue, 'blue')] %}
+            <div style="margin-top: 4px;">
+                热号
+                {% for n, c in part.hot %}<span class="ball ball-{{ color }}" title="出现 {{ c }} 次">{{ n|fmt_num }}</span>{% endfor %}
+                冷号
+                {% for n, c in part.cold %}<span class="ball ball-{{ color }}" title="出现 {{ c }} 次" style="opacity: 0.6;">{{ n|fmt_num }}</span>{% endfor %}
+            </div>
+            {% endfor %}
         </div>
         <form method="post" action="{{ url_for('buy_recommend') }}">
             <input type="hidden" name="type" value="{{ recommendations.type }}">
@@ -1240,6 +1400,15 @@ TEMPLATE = """
                 </button>
             </div>
         </form>
+        <form method="post" action="{{ url_for('buy_recommend') }}" style="margin-top: 12px; display:flex; gap:8px; justify-content:flex-end; align-items:center;">
+            <input type="hidden" name="type" value="{{ recommendations.type }}">
+            <input type="hidden" name="issue" value="{{ recommendations.issue }}">
+            <input type="hidden" name="window" value="{{ recommendations.window }}">
+            <span style="font-size: 13px; color:#666;">按推荐权重批量生成</span>
+            <input type="number" name="bulk_count" min="1" value="100" style="width: 120px;">
+            <span style="font-size: 13px; color:#666;">注</span>
+            <button class="btn btn-ghost" type="submit">批量购买</button>
+        </form>
     </div>
     {% endif %}
 
@@ -1332,7 +1501,7 @@ TEMPLATE = """
                                 </td>
                                 <td style="font-weight: bold; color: {% if '一等奖' in t.prize %}#ffd700{% elif '二' in t.prize %}#ff7a00{% else %}#52c41a{% endif %}">
                                     {% if t.prize and t.prize != '未中奖' %}
-                                      {{ t.prize }}（{{ t.prize|prize_amount|fmt_money }} 元）
+                                      {{ t.prize }}（{{ t.prize|prize_amount(t.type)|fmt_money }} 元）
                                     {% else %}
                                       -
                                     {% endif %}
@@ -1419,7 +1588,7 @@ TEMPLATE = """
                                 </td>
                                 <td style="font-weight: bold; color: {% if '一等奖' in t.prize %}#ffd700{% elif '二' in t.prize %}#ff7a00{% else %}#52c41a{% endif %}">
                                     {% if t.prize and t.prize != '未中奖' %}
-                                      {{ t.prize }}（{{ t.prize|prize_amount|fmt_money }} 元）
+                                      {{ t.prize }}（{{ t.prize|prize_amount(t.type)|fmt_money }} 元）
                                     {% else %}
                                       -
                                     {% endif %}
@@ -1486,7 +1655,7 @@ TEMPLATE = """
                         </td>
                         <td>
                             {% if t.prize and t.prize != '未中奖' %}
-                              {{ t.prize }}（{{ t.prize|prize_amount|fmt_money }} 元）
+                              {{ t.prize }}（{{ t.prize|prize_amount(t.type)|fmt_money }} 元）
                             {% else %}
                               {{ t.prize or '-' }}
                             {% endif %}
@@ -1613,7 +1782,11 @@ HISTORY_TEMPLATE = """
 </html>
 """
 
+# 内嵌模板注册到 DictLoader：首次渲染时编译一次，之后的请求直接执行 jinja 环境中缓存的模板
+app.jinja_loader = DictLoader({"index.html": TEMPLATE, "history.html": HISTORY_TEMPLATE})
+
 
 if __name__ == "__main__":
+    start_prefetcher()
     # host=0.0.0.0 方便局域网设备访问；可按需改端口
     app.run(host="0.0.0.0", port=5000, debug=False)